@@ -0,0 +1,75 @@
+"""
+Synthetic tours, gpx tracks, and signals shared by the benchmarks.
+All of them are built from the same seeded random walk.
+"""
+
+import numpy as np
+
+def random_walk(n, seed=0):
+    """Return latitude, longitude, and elevation of a random walk of ``n`` points."""
+
+    rng = np.random.default_rng(seed)
+    lat = 47 + np.cumsum(rng.normal(0, 1e-4, size=n))
+    lon = 8 + np.cumsum(rng.normal(0, 1e-4, size=n))
+    ele = 500 + np.cumsum(rng.normal(0, 1, size=n))
+
+    return lat, lon, ele
+
+def synthetic_tour(n, seed=0):
+    """Return a komoot tour item with ``n`` coordinates and ``'id'`` ``seed``."""
+
+    lat, lon, ele = random_walk(n, seed)
+
+    return {
+            'id': seed,
+            'coordinates': [ {'lat': a, 'lng': b, 'alt': c} for a, b, c in zip(lat.tolist(), lon.tolist(), ele.tolist()) ],
+           }
+
+def synthetic_tracks(n, seed=0):
+    """Return a list with a single ``gpxpy`` track of ``n`` points."""
+
+    import gpxpy.gpx
+
+    lat, lon, ele = random_walk(n, seed)
+
+    segment = gpxpy.gpx.GPXTrackSegment()
+    for a, b, c in zip(lat, lon, ele):
+        segment.points.append(gpxpy.gpx.GPXTrackPoint(a, b, elevation=c))
+
+    track = gpxpy.gpx.GPXTrack()
+    track.segments.append(segment)
+
+    return [track]
+
+def write_synthetic_gpx(fn, n, seed=0):
+    """Write a gpx file with a single segment of ``n`` timestamped points."""
+
+    lat, lon, ele = random_walk(n, seed)
+
+    with open(fn, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1" creator="komoog">\n'
+                '<trk><name>synthetic</name><trkseg>\n')
+        for i, (a, b, c) in enumerate(zip(lat, lon, ele)):
+            f.write(f'<trkpt lat="{a:.7f}" lon="{b:.7f}"><ele>{c:.1f}</ele>'
+                    f'<time>2021-08-24T{(i//3600)%24:02d}:{(i//60)%60:02d}:{i%60:02d}Z</time></trkpt>\n')
+        f.write('</trkseg></trk></gpx>\n')
+
+def synthetic_profile(n, seed=0):
+    """Return distance and elevation of a profile of ``n`` points."""
+
+    rng = np.random.default_rng(seed)
+    distance = np.concatenate([[0.], np.cumsum(rng.random(n-1))])
+    elevation = 500 + np.cumsum(rng.normal(size=n))
+
+    return distance, elevation
+
+def synthetic_signal(n, seed=0):
+    """Return a normalized signal ``(x, y)`` of ``n`` irregularly spaced points."""
+
+    rng = np.random.default_rng(seed)
+    x = np.concatenate([[0.], np.sort(rng.random(n-2)), [1.]])
+    y = np.cumsum(rng.normal(size=n))
+    y = (y - y.min()) / (y.max() - y.min()) * 2 - 1
+
+    return x, y
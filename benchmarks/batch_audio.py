@@ -0,0 +1,57 @@
+"""
+Measure how :func:`komoog.audio.convert_tours_to_audio` scales
+with the number of worker processes.
+
+Usage::
+
+    python batch_audio.py [number_of_tours] [points_per_tour]
+"""
+
+import sys
+import os
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+import komoog.audio
+from komoog.audio import convert_tour_to_audio, convert_tours_to_audio
+
+from _synthetic import synthetic_tour
+
+def disable_wavetable_cache():
+    """Measure rendering, not cache lookups."""
+    komoog.audio.wavetable_cache = None
+
+if __name__ == "__main__":
+
+    number_of_tours = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    tours = [ synthetic_tour(points, seed=i) for i in range(number_of_tours) ]
+    kwargs = dict(approximate_length_in_seconds=2)
+
+    disable_wavetable_cache()
+
+    # trigger the lazy imports of scipy before timing anything
+    convert_tour_to_audio(synthetic_tour(100), **kwargs)
+
+    t0 = perf_counter()
+    for tour in tours:
+        convert_tour_to_audio(tour, **kwargs)
+    t_serial = perf_counter() - t0
+
+    print(f"{number_of_tours} tours with {points} points each")
+    print(f"{'workers':>8} {'chunksize':>10} {'time [s]':>10} {'tours/s':>10} {'speedup':>8}")
+    print(f"{'serial':>8} {'-':>10} {t_serial:>10.2f} {number_of_tours/t_serial:>10.1f} {1:>8.1f}")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        for chunksize in [1, 8]:
+            # workers disable the cache themselves, such that
+            # they don't inherit one filled by an earlier run
+            with ProcessPoolExecutor(max_workers=workers, initializer=disable_wavetable_cache) as executor:
+                t0 = perf_counter()
+                for _ in convert_tours_to_audio(tours, max_workers=workers, chunksize=chunksize, executor=executor, **kwargs):
+                    pass
+                t = perf_counter() - t0
+            print(f"{workers:>8d} {chunksize:>10d} {t:>10.2f} {number_of_tours/t:>10.1f} {t_serial/t:>8.1f}")
+        workers *= 2
@@ -0,0 +1,45 @@
+"""
+Render a gallery of single loops one by one with
+:func:`komoog.audio.convert_signal_to_audio` and in a single batch
+with :func:`komoog.audio.convert_signals_to_audio`, and report the
+maximum and median deviation between both (in 16-bit units).
+
+Usage::
+
+    python batch_loops.py [number_of_signals]
+"""
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import komoog.audio
+from komoog.audio import convert_signal_to_audio, convert_signals_to_audio
+
+from _synthetic import synthetic_signal
+
+if __name__ == "__main__":
+
+    number_of_signals = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+    # measure rendering, not cache lookups
+    komoog.audio.wavetable_cache = None
+
+    rng = np.random.default_rng(0)
+    signals = [ synthetic_signal(int(n), seed=i) for i, n in enumerate(rng.integers(100, 20000, size=number_of_signals)) ]
+
+    # trigger the lazy imports of scipy before timing anything
+    convert_signals_to_audio(signals[:1], approximate_length_in_seconds=0)
+
+    print(f"{number_of_signals} signals")
+    print(f"{'resampler':>10} {'single [ms]':>12} {'batch [ms]':>12} {'max. dev.':>10} {'median dev.':>12}")
+    for resampler in ['cubic', 'interp1d', 'keys', 'linear']:
+        t0 = perf_counter()
+        single = np.array([ convert_signal_to_audio(x, y, approximate_length_in_seconds=0, resampler=resampler)[0]
+                            for x, y in signals ])
+        t1 = perf_counter()
+        batch, _ = convert_signals_to_audio(signals, approximate_length_in_seconds=0, resampler=resampler)
+        t2 = perf_counter()
+        deviation = np.max(np.abs(single.astype(int) - batch), axis=1)
+        print(f"{resampler:>10} {1e3*(t1-t0):>12.1f} {1e3*(t2-t1):>12.1f} {deviation.max():>10d} {np.median(deviation):>12.1f}")
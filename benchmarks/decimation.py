@@ -0,0 +1,34 @@
+"""
+Render time of a single loop with and without the
+pre-decimation in :func:`komoog.audio._smooth_signal` across
+track sizes, and the maximum deviation between both (in 16-bit
+units).
+"""
+
+import numpy as np
+
+import komoog.audio
+from komoog.audio import _render_single_loop
+
+from resampling import timeit
+from _synthetic import synthetic_signal
+
+if __name__ == "__main__":
+
+    tune = komoog.audio.get_tune('C')
+    decimation = komoog.audio._DECIMATION_POINTS_PER_SAMPLE
+
+    # trigger the lazy imports of scipy before timing anything
+    _render_single_loop(np.linspace(0, 1, 10), np.zeros(10), tune, 44100)
+
+    print(f"{'points':>8} {'decimated [ms]':>15} {'full [ms]':>10} {'max. deviation':>15}")
+    for n in [1_000, 10_000, 100_000, 1_000_000]:
+        x, y = synthetic_signal(n)
+        komoog.audio._DECIMATION_POINTS_PER_SAMPLE = decimation
+        t_decimated, decimated = timeit(lambda: _render_single_loop(x, y, tune, 44100))
+        komoog.audio._DECIMATION_POINTS_PER_SAMPLE = 2*n
+        t_full, full = timeit(lambda: _render_single_loop(x, y, tune, 44100))
+        deviation = np.max(np.abs(decimated.astype(int) - full))
+        print(f"{n:>8d} {1e3*t_decimated:>15.2f} {1e3*t_full:>10.2f} {deviation:>15d}")
+
+    komoog.audio._DECIMATION_POINTS_PER_SAMPLE = decimation
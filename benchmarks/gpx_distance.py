@@ -0,0 +1,47 @@
+"""
+Compare the vectorized distance computation of
+:func:`komoog.gpx.convert_gpx_tracks_to_arrays` with the
+former point-by-point loop over ``gpxpy``'s ``distance_2d``.
+"""
+
+from time import perf_counter
+
+import numpy as np
+
+from komoog.gpx import convert_gpx_tracks_to_arrays
+
+from _synthetic import synthetic_tracks
+
+def loop_gpx_tracks_to_arrays(gpx_tracks):
+    """The pre-vectorization implementation (single segment case)."""
+
+    distance = [0.]
+    elevation = []
+
+    for track in gpx_tracks:
+        for segment in track.segments:
+            points = segment.points
+            elevation.append(points[0].elevation)
+            for A, B in zip(points[:-1], points[1:]):
+                distance.append(A.distance_2d(B)+distance[-1])
+                elevation.append(B.elevation)
+
+    return np.array(distance), np.array(elevation)
+
+def timeit(func, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        result = func(*args)
+        times.append(perf_counter()-t0)
+    return min(times), result
+
+if __name__ == "__main__":
+
+    print(f"{'points':>8} {'loop [s]':>10} {'vectorized [s]':>15} {'speedup':>8} {'max rel. err':>13}")
+    for n in [1_000, 10_000, 50_000, 100_000, 500_000]:
+        tracks = synthetic_tracks(n)
+        t_loop, (d_loop, _) = timeit(loop_gpx_tracks_to_arrays, tracks)
+        t_vec, (d_vec, _) = timeit(convert_gpx_tracks_to_arrays, tracks)
+        err = np.max(np.abs(d_vec[1:]-d_loop[1:])/d_loop[1:])
+        print(f"{n:>8d} {t_loop:>10.4f} {t_vec:>15.4f} {t_loop/t_vec:>8.1f} {err:>13.2e}")
@@ -0,0 +1,53 @@
+"""
+Compare peak memory (max RSS) and wall time of reading a large
+gpx file with :func:`komoog.io.read_gpx` (full ``gpxpy`` object tree)
+and with the streaming parser :func:`komoog.io.read_gpx_arrays`.
+
+Every reader runs in a fresh subprocess such that the peak RSS
+values are not polluted by each other.
+
+Usage::
+
+    python gpx_streaming.py [number_of_points]
+"""
+
+import sys
+import os
+import resource
+import subprocess
+import tempfile
+from time import perf_counter
+
+from _synthetic import write_synthetic_gpx
+
+def run_reader(reader, fn):
+
+    from komoog.gpx import convert_gpx_tracks_to_arrays, convert_segments_to_arrays
+    from komoog.io import read_gpx, read_gpx_arrays
+
+    t0 = perf_counter()
+    if reader == 'read_gpx':
+        distance, elevation = convert_gpx_tracks_to_arrays(read_gpx(fn).tracks)
+    elif reader == 'read_gpx_arrays':
+        distance, elevation = convert_segments_to_arrays(read_gpx_arrays(fn))
+    t1 = perf_counter()
+
+    # ru_maxrss is in kB on Linux
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{reader:>16} {t1-t0:>10.2f} {maxrss:>14.1f} {distance[-1]:>14.1f}")
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--reader':
+        run_reader(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fn = os.path.join(tmpdir, 'synthetic.gpx')
+        write_synthetic_gpx(fn, n)
+        print(f"{n} points, {os.path.getsize(fn)/1024**2:.1f} MB")
+        print(f"{'reader':>16} {'time [s]':>10} {'max RSS [MB]':>14} {'distance [m]':>14}")
+        for reader in ['read_gpx', 'read_gpx_arrays']:
+            subprocess.run([sys.executable, __file__, '--reader', reader, fn], check=True)
@@ -0,0 +1,46 @@
+"""
+Compare :func:`komoog.audio.convert_distance_and_elevation_to_signal`
+with and without validation to the former implementation that used
+Python's builtin ``min``/``max`` on large synthetic profiles.
+"""
+
+import numpy as np
+
+import komoog.audio
+from komoog.audio import convert_distance_and_elevation_to_signal
+
+from resampling import timeit
+from _synthetic import synthetic_profile
+
+def former_convert_distance_and_elevation_to_signal(distance, elevation, max_elevation_difference=0):
+    """The implementation before the vectorized fast path."""
+
+    assert(np.all(np.diff(distance) >= 0))
+    assert(len(distance) == len(elevation))
+
+    mn = min(elevation)
+    mx = max(elevation)
+    elevation_diff = mx - mn
+
+    maximize_signal = elevation_diff >= max_elevation_difference
+
+    mean = komoog.audio._trapezoid(elevation,distance) / distance[-1]
+
+    if maximize_signal:
+        y = (elevation - mn) / elevation_diff * 2. - 1.
+    else:
+        y = (elevation - mean) / max_elevation_difference * 2.
+
+    x = distance / np.max(distance)
+
+    return x, y
+
+if __name__ == "__main__":
+
+    print(f"{'points':>9} {'former [ms]':>12} {'validate [ms]':>14} {'no validation [ms]':>19}")
+    for n in [10_000, 100_000, 1_000_000, 10_000_000]:
+        distance, elevation = synthetic_profile(n)
+        t_former, _ = timeit(lambda: former_convert_distance_and_elevation_to_signal(distance, elevation))
+        t_validate, _ = timeit(lambda: convert_distance_and_elevation_to_signal(distance, elevation))
+        t_fast, _ = timeit(lambda: convert_distance_and_elevation_to_signal(distance, elevation, validate=False))
+        print(f"{n:>9d} {1e3*t_former:>12.2f} {1e3*t_validate:>14.2f} {1e3*t_fast:>19.2f}")
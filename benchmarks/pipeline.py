@@ -0,0 +1,196 @@
+"""
+Benchmark suite of the gpx → signal → audio pipeline on synthetic
+tours. Every case records the minimum and median wall time over
+several repetitions and the peak memory allocated during a single
+separate run (measured with ``tracemalloc``). Results are written
+as JSON lines, one record per case, preceded by a record that
+describes the environment.
+
+Usage::
+
+    python pipeline.py [--sizes 1000 10000 100000 1000000]
+                       [--sampling-rates 22050 44100 48000]
+                       [--durations 1 5]
+                       [--output results.jsonl]
+
+    python pipeline.py compare old.jsonl new.jsonl
+"""
+
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from time import perf_counter
+from pathlib import Path
+
+import numpy as np
+import scipy
+import gpxpy
+
+import komoog
+import komoog.audio
+from komoog.gpx import (
+        convert_tour_to_gpx_tracks,
+        convert_gpx_tracks_to_arrays,
+        convert_tour_to_arrays,
+    )
+from komoog.audio import (
+        convert_distance_and_elevation_to_signal,
+        convert_signal_to_audio,
+        convert_distance_and_elevation_to_profile_audio,
+    )
+
+from _synthetic import synthetic_tour
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SAMPLING_RATES = [22050, 44100, 48000]
+DURATIONS = [1, 5]
+
+def measure(func, repeat=5, min_time=1.):
+    """
+    Call ``func`` up to ``repeat`` times (at least once) but stop
+    early once ``min_time`` seconds have been spent. Afterwards,
+    measure the peak memory of a single call.
+    """
+
+    times = []
+    while len(times) < repeat and (not times or sum(times) < min_time):
+        t0 = perf_counter()
+        func()
+        times.append(perf_counter()-t0)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+            'time_min': min(times),
+            'time_median': float(np.median(times)),
+            'repeats': len(times),
+            'peak_memory_bytes': peak,
+           }
+
+def get_environment():
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                cwd=Path(__file__).parent,
+                                capture_output=True,
+                                text=True,
+                                ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+            'benchmark': 'environment',
+            'komoog': komoog.__version__,
+            'commit': commit,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'gpxpy': gpxpy.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+           }
+
+def iter_cases(sizes, sampling_rates, durations):
+    """Yield ``(benchmark, params, func)`` for all cases."""
+
+    for n in sizes:
+        tour = synthetic_tour(n)
+        tracks = convert_tour_to_gpx_tracks(tour)
+        distance, elevation = convert_tour_to_arrays(tour)
+        x, y = convert_distance_and_elevation_to_signal(distance, elevation)
+        params = {'points': n}
+
+        yield 'convert_tour_to_gpx_tracks', params, lambda: convert_tour_to_gpx_tracks(tour)
+        yield 'convert_gpx_tracks_to_arrays', params, lambda: convert_gpx_tracks_to_arrays(tracks)
+        yield 'convert_distance_and_elevation_to_signal', params, lambda: convert_distance_and_elevation_to_signal(distance, elevation)
+
+        for sampling_rate in sampling_rates:
+            for duration in durations:
+                params = {'points': n, 'sampling_rate': sampling_rate, 'duration': duration}
+                yield 'convert_signal_to_audio', params, \
+                        lambda: convert_signal_to_audio(x, y,
+                                                        sampling_rate=sampling_rate,
+                                                        length_in_samples=int(round(duration*sampling_rate)))
+                yield 'convert_distance_and_elevation_to_profile_audio', params, \
+                        lambda: convert_distance_and_elevation_to_profile_audio(distance, elevation,
+                                                                                sampling_rate=sampling_rate,
+                                                                                approximate_length_in_seconds=duration)
+
+        del tour, tracks
+
+def run(sizes=SIZES, sampling_rates=SAMPLING_RATES, durations=DURATIONS, repeat=5, min_time=1., output=None):
+
+    # measure rendering, not cache lookups
+    komoog.audio.wavetable_cache = None
+
+    # trigger the lazy imports of scipy before timing anything
+    x = np.linspace(0, 1, 10)
+    convert_signal_to_audio(x, x, length_in_samples=10)
+    convert_distance_and_elevation_to_profile_audio(x, x, length_in_samples=10)
+
+    out = open(output, 'w') if output is not None else sys.stdout
+
+    try:
+        out.write(json.dumps(get_environment()) + '\n')
+        for benchmark, params, func in iter_cases(sizes, sampling_rates, durations):
+            record = {'benchmark': benchmark, 'params': params}
+            record.update(measure(func, repeat=repeat, min_time=min_time))
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            if output is not None:
+                print(f"{benchmark:<50} {json.dumps(params):<60} "
+                      f"{1e3*record['time_min']:>10.2f} ms {record['peak_memory_bytes']/2**20:>9.1f} MiB")
+    finally:
+        if output is not None:
+            out.close()
+
+def read_results(fn):
+
+    results = {}
+    with open(fn) as f:
+        for line in f:
+            record = json.loads(line)
+            if record['benchmark'] == 'environment':
+                continue
+            key = (record['benchmark'], json.dumps(record['params'], sort_keys=True))
+            results[key] = record
+
+    return results
+
+def compare(old_fn, new_fn):
+    """Print time and memory ratios new/old for cases present in both files."""
+
+    old = read_results(old_fn)
+    new = read_results(new_fn)
+
+    print(f"{'benchmark':<50} {'params':<60} {'time':>8} {'memory':>8}")
+    for key in old:
+        if key not in new:
+            continue
+        benchmark, params = key
+        time_ratio = new[key]['time_min'] / old[key]['time_min']
+        memory_ratio = new[key]['peak_memory_bytes'] / max(old[key]['peak_memory_bytes'], 1)
+        print(f"{benchmark:<50} {params:<60} {time_ratio:>8.2f} {memory_ratio:>8.2f}")
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        compare(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--sampling-rates', type=int, nargs='+', default=SAMPLING_RATES)
+    parser.add_argument('--durations', type=float, nargs='+', default=DURATIONS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=1.)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    run(args.sizes, args.sampling_rates, args.durations, args.repeat, args.min_time, args.output)
@@ -0,0 +1,44 @@
+"""
+Microbenchmark of the resamplers available in
+:func:`komoog.audio.convert_signal_to_audio` across track sizes,
+including their maximum deviation from the former
+``interp1d``-based implementation (in 16-bit units).
+"""
+
+from time import perf_counter
+
+import numpy as np
+
+import komoog.audio
+from komoog.audio import convert_signal_to_audio
+
+from _synthetic import synthetic_signal
+
+RESAMPLERS = ['interp1d', 'cubic', 'keys', 'linear']
+
+def timeit(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        result = func()
+        times.append(perf_counter()-t0)
+    return min(times), result
+
+if __name__ == "__main__":
+
+    # measure rendering, not cache lookups
+    komoog.audio.wavetable_cache = None
+
+    print(f"{'points':>8} " + " ".join(f"{r+' [ms]':>14}" for r in RESAMPLERS) + " " + " ".join(f"{'err '+r:>12}" for r in RESAMPLERS[1:]))
+    for n in [100, 1_000, 10_000, 100_000, 1_000_000]:
+        x, y = synthetic_signal(n)
+        times = []
+        audios = []
+        for resampler in RESAMPLERS:
+            t, (audio, _) = timeit(lambda: convert_signal_to_audio(x, y,
+                                                                  approximate_length_in_seconds=0,
+                                                                  resampler=resampler))
+            times.append(t)
+            audios.append(audio.astype(int))
+        errors = [ np.max(np.abs(a-audios[0])) for a in audios[1:] ]
+        print(f"{n:>8d} " + " ".join(f"{1e3*t:>14.3f}" for t in times) + " " + " ".join(f"{e:>12d}" for e in errors))
@@ -14,6 +14,25 @@ from .metadata import (
         __status__,
     )
 
-from .paths import _prepare
+import importlib
 
-_prepare()
+# submodules are imported on first access, such that `import komoog`
+# does not pull in scipy, gpxpy, requests, or audio libraries
+_SUBMODULES = (
+        'audio',
+        'gpx',
+        'instrument',
+        'io',
+        'komoot',
+        'paths',
+        'plot',
+        'sinks',
+    )
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_SUBMODULES))
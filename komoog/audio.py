@@ -3,12 +3,17 @@
 Audio handling and conversion.
 """
 
+import os
+import hashlib
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from pathlib import Path
+
 import numpy as np
-from scipy.interpolate import interp1d
-from scipy.signal import savgol_filter
-import simpleaudio as sa
 
-from komoog.gpx import convert_gpx_tracks_to_arrays, convert_tour_to_gpx_tracks
+from komoog.gpx import convert_tour_to_arrays
+from komoog.instrument import stage
 
 _NOTES = {
             'C': -9,
@@ -32,6 +37,170 @@ _NOTES = {
 
 _TUNE_A = 440 #Hz
 
+_MEMMAP_REFERENCE = 'komoog.memmap'
+
+_MIN_WAVETABLE_SIZE = 2048
+_PHASE_GRID_POINTS_PER_PERIOD = 16
+
+# signals are pre-decimated to this many grid points per output sample
+_DECIMATION_POINTS_PER_SAMPLE = 16
+
+# number of points per period from which harmonics are computed
+_HARMONICS_TABLE_SIZE = 4096
+
+# signals with more points are not cached, as hashing them would
+# cost about as much as rendering them
+_MAX_CACHED_POINTS = 32768
+
+# part of every cache key, increase whenever rendered waveforms change
+_WAVETABLE_CACHE_VERSION = 1
+
+# np.trapz was renamed to np.trapezoid in numpy 2.0
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+class WavetableCache():
+    """
+    A cache for rendered single-period waveforms, keyed by a hash
+    of the normalized signal and the render parameters.
+
+    Waveforms are held in memory with least-recently-used eviction.
+    If ``directory`` is given, waveforms are additionally persisted
+    there as ``.npy`` files and survive the process. The cache used
+    by :func:`komoog.audio.convert_signal_to_audio` is the module
+    attribute ``komoog.audio.wavetable_cache``, e.g.
+
+    .. code:: python
+
+        import komoog.audio
+        from komoog.paths import customdir
+
+        komoog.audio.wavetable_cache = komoog.audio.WavetableCache(
+                                        directory=customdir / 'wavetables',
+                                       )
+
+    Set it to ``None`` to disable caching. Signals with more than
+    ``_MAX_CACHED_POINTS`` points are never cached, since hashing
+    them costs about as much as rendering them.
+
+    Parameters
+    ==========
+    maxsize : int, default = 256
+        Maximum number of waveforms held in memory.
+    directory : str or pathlib.Path, default = None
+        Directory of the on-disk tier. If ``None``, waveforms are
+        only cached in memory.
+
+    Attributes
+    ==========
+    hits : int
+        Number of lookups that were answered from memory.
+    disk_hits : int
+        Number of lookups that were answered from disk.
+    misses : int
+        Number of lookups that were not answered.
+    """
+
+    def __init__(self, maxsize=256, directory=None):
+
+        self.maxsize = maxsize
+        self.directory = None if directory is None else Path(directory)
+        self._data = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(x, y, **parameters):
+        """
+        Return a hash of the signal ``(x, y)`` and keyword
+        render parameters.
+        """
+
+        h = hashlib.sha1()
+        h.update(f'komoog.wavetable.{_WAVETABLE_CACHE_VERSION}|'.encode())
+        for array in (x, y):
+            h.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+            h.update(b'|')
+        h.update(repr(sorted(parameters.items())).encode())
+
+        return h.hexdigest()
+
+    def get(self, key):
+        """Return the waveform stored under ``key`` or ``None``."""
+
+        try:
+            audio = self._data[key]
+        except KeyError:
+            audio = None
+        else:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return audio
+
+        if self.directory is not None:
+            fn = self.directory / (key + '.npy')
+            if fn.exists():
+                audio = np.load(fn)
+                self._store(key, audio)
+                self.disk_hits += 1
+                return audio
+
+        self.misses += 1
+
+        return None
+
+    def put(self, key, audio):
+        """Store the waveform ``audio`` under ``key``."""
+
+        self._store(key, audio)
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fn = self.directory / (key + '.npy')
+            tmp = self.directory / f'{key}.{os.getpid()}.tmp.npy'
+            np.save(tmp, audio)
+            os.replace(tmp, fn)
+
+    def _store(self, key, audio):
+
+        audio.flags.writeable = False
+        self._data[key] = audio
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all waveforms from memory and reset the counters."""
+
+        self._data.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return hit/miss counters and the current size as a dict."""
+
+        return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+               }
+
+wavetable_cache = WavetableCache()
+
+def _get_wavetable_cache(x):
+    """Return the wavetable cache, or ``None`` if the signal ``x`` is too long to be cached."""
+
+    if len(x) > _MAX_CACHED_POINTS:
+        return None
+
+    return wavetable_cache
+
 def get_tune(tune):
     """
     Convert a tune value to a frequency.
@@ -45,17 +214,40 @@ def get_tune(tune):
 
     return tune
 
-def play_audio(audio_data, sampling_rate):
+def play_audio(audio_data, sampling_rate, backend='simpleaudio', num_channels=None, **kwargs):
     """
     Play audio data.
+
+    Parameters
+    ==========
+    audio_data : numpy.ndarray of numpy.int16
+        The audio signal. Multi-channel audio has shape
+        ``(samples, num_channels)``.
+    sampling_rate : int
+        The sampling rate of the audio signal.
+    backend : str, default = 'simpleaudio'
+        Name of a backend registered in :mod:`komoog.sinks`,
+        e.g. ``'simpleaudio'``, ``'wav'``, ``'pcm'``, or ``'null'``.
+        The backend is only imported when this function is called.
+    num_channels : int, default = None
+        Number of channels. If ``None``, it is inferred from the
+        shape of ``audio_data``.
+    **kwargs
+        Passed to the backend, e.g. ``fn`` for ``backend='wav'``.
     """
-    play_obj = sa.play_buffer(audio_data, 1, 2,sampling_rate)
-    play_obj.wait_done()
+
+    from komoog.sinks import get_backend, stream_audio
+
+    if num_channels is None:
+        num_channels = 1 if np.ndim(audio_data) == 1 else np.shape(audio_data)[1]
+
+    stream_audio([audio_data], get_backend(backend, **kwargs), sampling_rate, num_channels)
 
 
 def convert_distance_and_elevation_to_signal(distance,
                                              elevation,
                                              max_elevation_difference=0,
+                                             validate=True,
                                              ):
     """
     Convert a distance/elevation profile to a signal, i.e. normalize distance
@@ -74,6 +266,10 @@ def convert_distance_and_elevation_to_signal(distance,
         scale of the audio signal. If the elevation profile's elevation
         difference is larger than this value, the signal will simply be
         maximized. A good value is ``max_elevation_difference = 2000``.
+    validate : bool, default = True
+        Whether to check that ``distance`` is sorted. Can be
+        switched off for profiles that are sorted by construction,
+        e.g. the ones returned by :func:`komoog.gpx.convert_tour_to_arrays`.
 
     Returns
     =======
@@ -83,27 +279,44 @@ def convert_distance_and_elevation_to_signal(distance,
         signal in range [-1,1]
     """
 
-    # assert that data is sorted
-    assert(np.all(np.diff(distance) >= 0))
+    with stage('audio.signal', points=len(distance)) as s:
+        x, y = _convert_distance_and_elevation_to_signal(distance, elevation, max_elevation_difference, validate)
+        s.update(nbytes=x.nbytes+y.nbytes)
+
+    return x, y
+
+def _convert_distance_and_elevation_to_signal(distance, elevation, max_elevation_difference, validate=True):
+
+    distance = np.asarray(distance)
+    elevation = np.asarray(elevation)
 
     # assert that arrays have same length
     assert(len(distance) == len(elevation))
 
-    mn = min(elevation)
-    mx = max(elevation)
+    if validate:
+        # assert that data is sorted
+        assert(np.all(distance[1:] >= distance[:-1]))
+
+    mn = elevation.min()
+    mx = elevation.max()
     elevation_diff = mx - mn
 
     maximize_signal = elevation_diff >= max_elevation_difference
 
-    # position the signal such that the area under the curve is equal
-    mean = np.trapz(elevation,distance) / distance[-1]
-
     if maximize_signal:
-        y = (elevation - mn) / elevation_diff * 2. - 1.
+        y = np.subtract(elevation, mn, dtype=float)
+        y /= elevation_diff
+        y *= 2.
+        y -= 1.
     else:
-        y = (elevation - mean) / max_elevation_difference * 2.
+        # position the signal such that the area under the curve is equal
+        mean = _trapezoid(elevation,distance) / distance[-1]
+        y = np.subtract(elevation, mean, dtype=float)
+        y /= max_elevation_difference
+        y *= 2.
 
-    x = distance / np.max(distance)
+    # sorted, hence the last distance is the largest
+    x = np.divide(distance, distance[-1], dtype=float)
 
     return x, y
 
@@ -113,6 +326,10 @@ def convert_distance_and_elevation_to_audio(distance,
                                             tune='C',
                                             sampling_rate=44100,
                                             approximate_length_in_seconds=1,
+                                            resampler='cubic',
+                                            length_in_samples=None,
+                                            synthesis='loop',
+                                            validate=True,
                                             ):
     """
     Convert a distance/elevation profile to an audio signal.
@@ -146,6 +363,30 @@ def convert_distance_and_elevation_to_audio(distance,
     approximate_length_in_seconds : float, default = 1.
         The desired length of the audio signal in seconds
         If equal to zero, will return a single loop.
+    resampler : str, default = 'cubic'
+        Method used to resample the smoothed signal to the audio
+        sampling grid. Can be any of
+
+        - ``'cubic'``: cubic spline (:class:`scipy.interpolate.CubicSpline`),
+        - ``'interp1d'``: cubic spline via :class:`scipy.interpolate.interp1d`
+          (slower, kept for reference),
+        - ``'keys'``: cubic convolution kernel without a spline fit,
+        - ``'linear'``: linear interpolation.
+    length_in_samples : int, default = None
+        If given, the audio signal will be exactly this
+        many samples long and ``approximate_length_in_seconds``
+        is ignored.
+    synthesis : str, default = 'loop'
+        How the audio signal is synthesized. Can be any of
+
+        - ``'loop'``: a single period of ``int(sampling_rate/tune)``
+          samples is rendered and repeated,
+        - ``'bandlimited'``: only the waveform's harmonics below the
+          Nyquist frequency are played, at exactly ``tune`` Hz. This
+          avoids aliasing and detuning at high tunes.
+    validate : bool, default = True
+        Whether to check that ``distance`` is sorted, see
+        :func:`komoog.audio.convert_distance_and_elevation_to_signal`.
 
     Returns
     =======
@@ -158,6 +399,7 @@ def convert_distance_and_elevation_to_audio(distance,
     x, y = convert_distance_and_elevation_to_signal(distance,
                                                     elevation,
                                                     max_elevation_difference=max_elevation_difference,
+                                                    validate=validate,
                                                     )
 
     return convert_signal_to_audio(x,
@@ -165,13 +407,119 @@ def convert_distance_and_elevation_to_audio(distance,
                                    tune=tune,
                                    sampling_rate=sampling_rate,
                                    approximate_length_in_seconds=approximate_length_in_seconds,
+                                   resampler=resampler,
+                                   length_in_samples=length_in_samples,
+                                   synthesis=synthesis,
                                   )
 
+def _decimate_signal(x, y, num_points):
+    """
+    Resample the piecewise linear signal ``y(x)``, ``x`` in range
+    [0,1], to a regular grid of ``num_points`` points, where
+    each point is the average of the signal over the bin of
+    width ``1/(num_points-1)`` around it (a box filter that
+    prevents aliasing). The bin averages are obtained from the
+    cumulative integral of the signal, such that the cost is a
+    single pass over the signal. As the signal is played in a
+    loop, the bins at both ends wrap around.
+    """
+
+    x_sample = np.linspace(0, 1, num_points)
+    half_width = 0.5 / (num_points-1)
+
+    # bin edges, shared by neighboring bins
+    edges = np.clip(np.linspace(-half_width, 1+half_width, num_points+1), x[0], x[-1])
+
+    integral = np.empty_like(x)
+    integral[0] = 0.
+    np.cumsum(0.5*(y[1:]+y[:-1])*np.diff(x), out=integral[1:])
+
+    # cumulative integral at the edges
+    i = np.clip(np.searchsorted(x, edges, side='right')-1, 0, len(x)-2)
+    dx = edges - x[i]
+    # the last interval may have zero width if the last points coincide
+    width = x[i+1] - x[i]
+    slope = np.divide(y[i+1]-y[i], width, out=np.zeros_like(dx), where=width > 0)
+    y_edges = y[i] + slope * dx
+    edge_integral = integral[i] + 0.5*(y[i]+y_edges)*dx
+
+    lower_integral = edge_integral[:-1]
+    upper_integral = edge_integral[1:]
+    lower = edges[:-1]
+    upper = edges[1:]
+    y_sample = (upper_integral - lower_integral) / (upper - lower)
+
+    # wrap the half-bins at both ends around
+    y_sample[0] = y_sample[-1] = (upper_integral[0] - lower_integral[0] + upper_integral[-1] - lower_integral[-1]) \
+                                 / (upper[0] - lower[0] + upper[-1] - lower[-1])
+
+    return x_sample, y_sample
+
+def _get_window_length(num_points, grid_size):
+    """
+    Return the odd length of the smoothing window on a grid of
+    ``grid_size`` points that covers the same fraction of the
+    signal as the default window on the ``num_points = 2*n+1``
+    points a signal of ``n`` points is resampled to.
+    """
+
+    if num_points > 400:
+        window_length = int(round(101 * grid_size / num_points))
+    else:
+        window_length = int(grid_size * 0.1)
+
+    if window_length % 2 == 0:
+        window_length += 1
+
+    return window_length
+
+def _smooth_signal(x, y, num_samples=None):
+    """
+    Resample a normalized signal to a regular grid and smooth it
+    periodically. Returns the grid ``x_sample`` in range [0,1]
+    and the smoothed signal ``y_filtered``.
+
+    If ``num_samples``, the number of samples the result will be
+    resampled to, is given and the signal has more points than
+    can be represented, it is pre-decimated to
+    ``_DECIMATION_POINTS_PER_SAMPLE*num_samples`` points with
+    :func:`komoog.audio._decimate_signal`. The smoothing window is
+    scaled to cover the same fraction of the signal.
+    """
+
+    from scipy.signal import savgol_filter
+
+    with stage('audio.smooth', points=len(x)) as s:
+
+        num_points = len(x)*2+1
+
+        if num_samples is not None and num_points > _DECIMATION_POINTS_PER_SAMPLE * num_samples:
+            with stage('audio.decimate', points=len(x)) as s_decimate:
+                x_sample, y_sample = _decimate_signal(x, y, _DECIMATION_POINTS_PER_SAMPLE * num_samples + 1)
+                s_decimate.update(samples=len(y_sample), nbytes=x_sample.nbytes+y_sample.nbytes)
+        else:
+            x_sample = np.linspace(0,1,num_points)
+            y_sample = np.interp(x_sample, x, y)
+
+        window_length = _get_window_length(num_points, len(y_sample))
+
+        if window_length > 3:
+            y_filtered = savgol_filter(y_sample, window_length, 2, mode='wrap')
+        else:
+            # the window is narrower than the decimation bins
+            y_filtered = y_sample
+        s.update(samples=len(y_filtered), nbytes=x_sample.nbytes+y_sample.nbytes+y_filtered.nbytes)
+
+    return x_sample, y_filtered
+
 def convert_signal_to_audio(x,
                             y,
                             tune='C',
                             sampling_rate=44100,
                             approximate_length_in_seconds=1,
+                            resampler='cubic',
+                            length_in_samples=None,
+                            synthesis='loop',
                             ):
     """
     Convert a normalized distance/elevation signal to an audio signal.
@@ -198,6 +546,27 @@ def convert_signal_to_audio(x,
     approximate_length_in_seconds : float, default = 1.
         The desired length of the audio signal in seconds
         If equal to zero, will return a single loop.
+    resampler : str, default = 'cubic'
+        Method used to resample the smoothed signal to the audio
+        sampling grid. Can be any of
+
+        - ``'cubic'``: cubic spline (:class:`scipy.interpolate.CubicSpline`),
+        - ``'interp1d'``: cubic spline via :class:`scipy.interpolate.interp1d`
+          (slower, kept for reference),
+        - ``'keys'``: cubic convolution kernel without a spline fit,
+        - ``'linear'``: linear interpolation.
+    length_in_samples : int, default = None
+        If given, the audio signal will be exactly this
+        many samples long and ``approximate_length_in_seconds``
+        is ignored.
+    synthesis : str, default = 'loop'
+        How the audio signal is synthesized. Can be any of
+
+        - ``'loop'``: a single period of ``int(sampling_rate/tune)``
+          samples is rendered and repeated,
+        - ``'bandlimited'``: only the waveform's harmonics below the
+          Nyquist frequency are played, at exactly ``tune`` Hz. This
+          avoids aliasing and detuning at high tunes.
 
     Returns
     =======
@@ -209,40 +578,376 @@ def convert_signal_to_audio(x,
 
     tune = get_tune(tune)
 
-    x_sample = np.linspace(0,1,len(x)*2+1)
-    f = interp1d(x, y, kind='linear')
-    y_sample = f(x_sample)
+    if synthesis == 'bandlimited':
+        if length_in_samples is None:
+            if approximate_length_in_seconds > 0:
+                length_in_samples = int(np.ceil(sampling_rate * approximate_length_in_seconds))
+            else:
+                length_in_samples = int(round(sampling_rate / tune))
+        table = _get_bandlimited_table(x, y, tune, sampling_rate, resampler)
+        return _synthesize_bandlimited(table, tune, sampling_rate, 0, length_in_samples), sampling_rate
+    elif synthesis != 'loop':
+        raise ValueError("`synthesis` has to be any of ['loop', 'bandlimited']")
+
+    cache = _get_wavetable_cache(x)
+    with stage('audio.cache') as s:
+        if cache is not None:
+            key = cache.key(x, y, tune=tune, sampling_rate=sampling_rate, resampler=resampler)
+            raw_audio = cache.get(key)
+        else:
+            raw_audio = None
+        s.update(hit=raw_audio is not None)
+
+    if raw_audio is None:
+        raw_audio = _render_single_loop(x, y, tune, sampling_rate, resampler)
+        if cache is not None:
+            cache.put(key, raw_audio)
+
+    with stage('audio.tile', samples_per_period=len(raw_audio)) as s:
+        if length_in_samples is not None:
+            audio = tile_audio(raw_audio, length_in_samples)
+        elif approximate_length_in_seconds > 0:
+            necessary_samples = sampling_rate * approximate_length_in_seconds
+            copies = int(np.ceil(necessary_samples/len(raw_audio)))
+            audio = tile_audio(raw_audio, copies*len(raw_audio))
+        else:
+            audio = raw_audio.copy()
+        s.update(samples=len(audio), nbytes=audio.nbytes)
 
-    if len(y_sample) > 400:
-        window_length = 101
-    else:
-        window_length = int(len(y_sample) * 0.1)
-        if window_length % 2 == 0:
-            window_length += 1
+    return audio, sampling_rate
+
+def tile_audio(audio, length_in_samples):
+    """
+    Repeat a single loop of audio data until it is exactly
+    ``length_in_samples`` samples long. The result is written
+    into a single preallocated array.
+
+    Parameters
+    ==========
+    audio : numpy.ndarray
+        A single loop of audio data. If the array has more
+        than one dimension, loops are repeated along the last axis.
+    length_in_samples : int
+        Length of the returned audio data.
+
+    Returns
+    =======
+    audio : numpy.ndarray
+        The repeated audio data, truncated within the last loop.
+    """
+
+    length_in_samples = int(length_in_samples)
+    if length_in_samples < 0:
+        raise ValueError("`length_in_samples` must not be negative")
+
+    period = audio.shape[-1]
 
-    y_filtered = savgol_filter(y_sample, window_length, 2, mode='wrap')
+    tiled = np.empty(audio.shape[:-1] + (length_in_samples,), dtype=audio.dtype)
+    filled = min(period, length_in_samples)
+    tiled[..., :filled] = audio[..., :filled]
+
+    # double the filled part until the array is full
+    while filled < length_in_samples:
+        n = min(filled, length_in_samples - filled)
+        tiled[..., filled:filled+n] = tiled[..., :n]
+        filled += n
+
+    return tiled
+
+def _cubic_convolution(y, t):
+    """
+    Evaluate the signal ``y``, given on a regular grid in range
+    [0,1], at positions ``t`` using the cubic convolution kernel
+    with ``a = -0.5`` (Catmull-Rom). Edge values are repeated.
+    If ``y`` is two-dimensional, each row is evaluated.
+    """
 
-    sampling_t = np.linspace(0,1/tune,int(sampling_rate/tune))
+    n = y.shape[-1] - 1
+    s = np.asarray(t) * n
+    i = np.clip(np.floor(s).astype(int), 0, n-1)
+    u = s - i
 
-    f = interp1d(x_sample/tune, y_filtered, kind='cubic')
-    y = f(sampling_t)
+    u2 = u * u
+    u3 = u2 * u
+    weights = (
+                -0.5*u3 + u2 - 0.5*u,
+                1.5*u3 - 2.5*u2 + 1.,
+                -1.5*u3 + 2.*u2 + 0.5*u,
+                0.5*u3 - 0.5*u2,
+              )
 
-    ymax = np.max(np.abs(y))
-    ymax = np.max([1.,ymax])
+    result = np.zeros(y.shape[:-1] + u.shape)
+    for offset, weight in zip(range(-1,3), weights):
+        result += weight * y[..., np.clip(i+offset, 0, n)]
 
-    # convert to 16-bit data
-    audio = y * 32767 / ymax
-    raw_audio = audio.astype(np.int16)
+    return result
 
-    if approximate_length_in_seconds > 0:
-        necessary_samples = sampling_rate * approximate_length_in_seconds
-        copies = int(np.ceil(necessary_samples/len(raw_audio)))
-        audio = np.concatenate([raw_audio]*copies)
+def _resample(x_sample, y_sample, t, resampler='cubic'):
+    """
+    Resample a signal given on the regular grid ``x_sample`` in
+    range [0,1] at positions ``t`` in range [0,1]. If ``y_sample``
+    is two-dimensional, all rows are resampled at once.
+    """
+
+    if resampler == 'cubic':
+        from scipy.interpolate import CubicSpline
+        return CubicSpline(x_sample, y_sample, axis=-1)(t)
+    elif resampler == 'interp1d':
+        from scipy.interpolate import interp1d
+        return interp1d(x_sample, y_sample, kind='cubic')(t)
+    elif resampler == 'keys':
+        return _cubic_convolution(y_sample, t)
+    elif resampler == 'linear':
+        if y_sample.ndim == 1:
+            return np.interp(t, x_sample, y_sample)
+        s = np.asarray(t) * (len(x_sample)-1)
+        i = np.clip(np.floor(s).astype(int), 0, len(x_sample)-2)
+        u = s - i
+        return y_sample[:, i] * (1.-u) + y_sample[:, i+1] * u
     else:
-        audio = raw_audio
+        raise ValueError("`resampler` has to be any of ['cubic', 'interp1d', 'keys', 'linear']")
 
-    return audio, sampling_rate
+def _render_single_loop(x, y, tune, sampling_rate, resampler='cubic'):
+    """
+    Render a single period of the audio signal of a normalized
+    signal as 16-bit data, ``tune`` being a frequency in Hz.
+    """
+
+    samples_per_period = int(sampling_rate/tune)
+    x_sample, y_filtered = _smooth_signal(x, y, samples_per_period)
+
+    with stage('audio.resample', points=len(x_sample), resampler=resampler) as s:
+        sampling_t = np.linspace(0,1,samples_per_period)
+
+        y = _resample(x_sample, y_filtered, sampling_t, resampler)
 
+        ymax = np.max(np.abs(y))
+        ymax = np.max([1.,ymax])
+
+        # convert to 16-bit data
+        audio = (y * 32767 / ymax).astype(np.int16)
+        s.update(samples=len(audio), nbytes=sampling_t.nbytes+y.nbytes+audio.nbytes)
+
+    return audio
+
+def _get_harmonics(x, y, resampler='cubic'):
+    """
+    Return the complex amplitudes of the harmonics of a single
+    period of the smoothed signal (the real FFT of
+    ``_HARMONICS_TABLE_SIZE`` samples), which do not depend on
+    tune or sampling rate and are therefore cached separately.
+    """
+
+    cache = _get_wavetable_cache(x)
+    if cache is not None:
+        key = cache.key(x, y, resampler=resampler, table_size=_HARMONICS_TABLE_SIZE, synthesis='harmonics')
+        harmonics = cache.get(key)
+        if harmonics is not None:
+            return harmonics
+
+    x_sample, y_filtered = _smooth_signal(x, y, _HARMONICS_TABLE_SIZE)
+
+    with stage('audio.harmonics', points=len(x_sample), resampler=resampler) as s:
+        phase = np.arange(_HARMONICS_TABLE_SIZE) / _HARMONICS_TABLE_SIZE
+        harmonics = np.fft.rfft(_resample(x_sample, y_filtered, phase, resampler))
+        s.update(samples=len(harmonics), nbytes=harmonics.nbytes)
+
+    if cache is not None:
+        cache.put(key, harmonics)
+
+    return harmonics
+
+def _get_bandlimited_table(x, y, tune, sampling_rate, resampler='cubic'):
+    """
+    Return a single period of the signal that only contains
+    harmonics below the Nyquist frequency, sampled at
+    ``_HARMONICS_TABLE_SIZE+1`` phases in range [0,1] and
+    scaled to 16-bit range.
+    """
+
+    harmonics = _get_harmonics(x, y, resampler).copy()
+
+    with stage('audio.bandlimit') as s:
+        # the k-th harmonic has frequency k*tune
+        number_of_harmonics = int(np.ceil(0.5 * sampling_rate / tune)) - 1
+        harmonics[number_of_harmonics+1:] = 0.
+        table = np.fft.irfft(harmonics, n=_HARMONICS_TABLE_SIZE)
+        table = np.append(table, table[0])
+
+        ymax = np.max([1., np.max(np.abs(table))])
+        table *= 32767 / ymax
+        s.update(harmonics=min(number_of_harmonics, len(harmonics)-1), samples=len(table), nbytes=table.nbytes)
+
+    return table
+
+def _synthesize_bandlimited(table, tune, sampling_rate, offset, length_in_samples):
+    """
+    Read samples ``offset`` to ``offset+length_in_samples`` of a
+    tone of exactly ``tune`` Hz from a band-limited wavetable.
+    """
+
+    with stage('audio.synthesize') as s:
+        phase = np.arange(offset, offset+length_in_samples, dtype=float)
+        phase *= tune / sampling_rate
+        np.mod(phase, 1., out=phase)
+        audio = np.interp(phase, np.linspace(0, 1, len(table)), table).astype(np.int16)
+        s.update(samples=len(audio), nbytes=phase.nbytes+audio.nbytes)
+
+    return audio
+
+def _render_loops(signals, samples_per_period, resampler='cubic'):
+    """
+    Render single periods of many normalized signals as rows of a
+    2D array of 16-bit data. All signals are resampled to a common
+    grid of ``_DECIMATION_POINTS_PER_SAMPLE*samples_per_period+1``
+    points (pre-decimating long signals) and smoothed with the
+    window that :func:`komoog.audio._smooth_signal` would use,
+    one ``savgol_filter`` call per distinct window length.
+    """
+
+    from scipy.signal import savgol_filter
+
+    grid_size = _DECIMATION_POINTS_PER_SAMPLE * samples_per_period + 1
+    x_sample = np.linspace(0, 1, grid_size)
+    y_sample = np.empty((len(signals), grid_size))
+    window_lengths = np.empty(len(signals), dtype=int)
+
+    with stage('audio.smooth', signals=len(signals), samples=grid_size) as s:
+
+        interpolated = []
+        for i, (x, y) in enumerate(signals):
+            num_points = len(x)*2+1
+            window_lengths[i] = _get_window_length(num_points, grid_size)
+            if num_points > grid_size - 1:
+                _, y_sample[i] = _decimate_signal(x, y, grid_size)
+            else:
+                interpolated.append(i)
+
+        # interpolate all remaining signals in a single call by
+        # shifting the k-th signal to range [2k, 2k+1]
+        if len(interpolated) > 0:
+            offsets = 2. * np.arange(len(interpolated))
+            xp = np.concatenate([ signals[i][0] + offset for i, offset in zip(interpolated, offsets) ])
+            fp = np.concatenate([ signals[i][1] for i in interpolated ])
+            t = (x_sample[None,:] + offsets[:,None]).ravel()
+            y_sample[interpolated] = np.interp(t, xp, fp).reshape(len(interpolated), grid_size)
+
+        for window_length in np.unique(window_lengths):
+            if window_length <= 3:
+                continue
+            rows = window_lengths == window_length
+            y_sample[rows] = savgol_filter(y_sample[rows], window_length, 2, mode='wrap', axis=1)
+
+        s.update(nbytes=y_sample.nbytes)
+
+    with stage('audio.resample', signals=len(signals), resampler=resampler) as s:
+        sampling_t = np.linspace(0, 1, samples_per_period)
+        y = _resample(x_sample, y_sample, sampling_t, resampler)
+
+        ymax = np.maximum(1., np.max(np.abs(y), axis=1, keepdims=True))
+        audio = (y * (32767 / ymax)).astype(np.int16)
+        s.update(samples=audio.size, nbytes=y.nbytes+audio.nbytes)
+
+    return audio
+
+def convert_signals_to_audio(signals,
+                             tune='C',
+                             sampling_rate=44100,
+                             approximate_length_in_seconds=1,
+                             resampler='cubic',
+                             length_in_samples=None,
+                             ):
+    """
+    Convert many normalized distance/elevation signals to audio
+    signals in a single batch, e.g. to render a gallery of loops.
+    Instead of rendering each signal separately as in
+    :func:`komoog.audio.convert_signal_to_audio`, all signals are
+    resampled to a common grid and smoothed and resampled as rows
+    of a single 2D array. Results deviate slightly from
+    :func:`komoog.audio.convert_signal_to_audio` for signals that
+    are short compared to the common grid.
+
+    Parameters
+    ==========
+    signals : list of tuple of numpy.ndarray
+        Each entry is a tuple ``(x, y)`` as returned by
+        :func:`komoog.audio.convert_distance_and_elevation_to_signal`.
+    tune : str or float
+        Desired frequency of the sound, see
+        :func:`komoog.audio.convert_signal_to_audio`.
+    sampling_rate : int, default = 44100
+        Sampling rate in Hz
+    approximate_length_in_seconds : float, default = 1.
+        The desired length of the audio signals in seconds
+        If equal to zero, single loops are returned.
+    resampler : str, default = 'cubic'
+        See :func:`komoog.audio.convert_signal_to_audio`.
+    length_in_samples : int, default = None
+        If given, the audio signals will be exactly this
+        many samples long and ``approximate_length_in_seconds``
+        is ignored.
+
+    Returns
+    =======
+    audio : numpy.ndarray of numpy.int16
+        The audio signals as rows of an array of shape
+        ``(len(signals), length)``. As all signals share the tune,
+        their loops have the same length and no padding is needed.
+    sampling_rate : int
+        The sampling rate of the audio signals.
+    """
+
+    tune = get_tune(tune)
+    samples_per_period = int(sampling_rate/tune)
+    signals = [ (np.asarray(x, dtype=float), np.asarray(y, dtype=float)) for x, y in signals ]
+
+    loops = np.empty((len(signals), samples_per_period), dtype=np.int16)
+
+    cache = wavetable_cache
+    keys = [ cache.key(x, y, tune=tune, sampling_rate=sampling_rate, resampler=resampler, batched=True)
+             if _get_wavetable_cache(x) is not None else None
+             for x, y in signals ]
+    missing = []
+    for i, key in enumerate(keys):
+        loop = cache.get(key) if key is not None else None
+        if loop is None:
+            missing.append(i)
+        else:
+            loops[i] = loop
+
+    if len(missing) > 0:
+        loops[missing] = _render_loops([ signals[i] for i in missing ], samples_per_period, resampler)
+        for i in missing:
+            if keys[i] is not None:
+                cache.put(keys[i], loops[i].copy())
+
+    if length_in_samples is None:
+        if approximate_length_in_seconds > 0:
+            copies = int(np.ceil(sampling_rate * approximate_length_in_seconds / samples_per_period))
+        else:
+            copies = 1
+        length_in_samples = copies * samples_per_period
+
+    return tile_audio(loops, length_in_samples), sampling_rate
+
+def _get_profile_sample_positions(x, y, periods, tune, sampling_rate):
+    """
+    Return a fine phase grid over ``periods`` periods and the time
+    (in samples) at which each of its points is reached if the pitch
+    of the ``i``-th period is ``tune * 2**y`` at position ``i/periods``.
+    """
+
+    from scipy.interpolate import CubicSpline
+
+    frequency_scalar = CubicSpline(x * periods, 2**y)
+
+    phase = np.linspace(0, periods, periods*_PHASE_GRID_POINTS_PER_PERIOD+1)
+    samples_per_phase = sampling_rate / (tune * frequency_scalar(phase))
+    sample_position = np.empty_like(phase)
+    sample_position[0] = 0.
+    np.cumsum((samples_per_phase[1:]+samples_per_phase[:-1]) * (0.5*np.diff(phase)), out=sample_position[1:])
+
+    return phase, sample_position
 
 def convert_distance_and_elevation_to_profile_audio(
                                             distance,
@@ -251,6 +956,9 @@ def convert_distance_and_elevation_to_profile_audio(
                                             tune='C',
                                             sampling_rate=44100,
                                             approximate_length_in_seconds=1,
+                                            resampler='cubic',
+                                            length_in_samples=None,
+                                            validate=True,
                                             ):
     """
     Convert a distance/elevation profile to an audio signal that
@@ -285,6 +993,25 @@ def convert_distance_and_elevation_to_profile_audio(
     approximate_length_in_seconds : float, default = 1.
         The desired length of the audio signal in seconds
         If equal to zero, will return a single loop.
+    resampler : str, default = 'cubic'
+        Method used to resample the smoothed signal to the audio
+        sampling grid. Can be any of
+
+        - ``'cubic'``: cubic spline (:class:`scipy.interpolate.CubicSpline`),
+        - ``'interp1d'``: cubic spline via :class:`scipy.interpolate.interp1d`
+          (slower, kept for reference),
+        - ``'keys'``: cubic convolution kernel without a spline fit,
+        - ``'linear'``: linear interpolation.
+    length_in_samples : int, default = None
+        If given, the audio signal will be exactly this
+        many samples long and ``approximate_length_in_seconds``
+        is ignored. The pitch is not affected, instead the
+        number of periods is chosen such that the profile
+        covers at least this many samples, and the remainder
+        is cut off.
+    validate : bool, default = True
+        Whether to check that ``distance`` is sorted, see
+        :func:`komoog.audio.convert_distance_and_elevation_to_signal`.
 
     Returns
     =======
@@ -297,46 +1024,94 @@ def convert_distance_and_elevation_to_profile_audio(
     x, y = convert_distance_and_elevation_to_signal(distance,
                                                     elevation,
                                                     max_elevation_difference=max_elevation_difference,
+                                                    validate=validate,
                                                    )
 
-    frequency_scalar = 2**y
-
-    # get length of audio signal
-    single_audio, _ = convert_signal_to_audio(
-                                   x,
-                                   y,
-                                   tune=tune,
-                                   sampling_rate=sampling_rate,
-                                   approximate_length_in_seconds=0,
-                                  )
-
-    full_audio, _ = convert_signal_to_audio(
-                                   x,
-                                   y,
-                                   tune=tune,
-                                   sampling_rate=sampling_rate,
-                                   approximate_length_in_seconds=approximate_length_in_seconds,
-                                  )
+    tune = get_tune(tune)
 
-    copies = int(np.ceil(len(full_audio)/len(single_audio)))
-    new_x = x * copies
-    f = interp1d(new_x,frequency_scalar,kind='cubic')
+    # single-period wavetable, smoothed once
+    samples_per_period = int(sampling_rate/tune)
+    table_size = max(samples_per_period, _MIN_WAVETABLE_SIZE)
+    x_sample, y_filtered = _smooth_signal(x, y, table_size)
+    with stage('audio.wavetable', points=len(x_sample), resampler=resampler) as s:
+        table_phase = np.linspace(0, 1, table_size+1)
+        table = _resample(x_sample, y_filtered, table_phase, resampler)
+        ymax = np.max([1., np.max(np.abs(table))])
+        table *= 32767 / ymax
+        s.update(samples=len(table), nbytes=table_phase.nbytes+table.nbytes)
+
+    with stage('audio.pitch', points=len(x)) as s:
+        if length_in_samples is not None:
+            approximate_length_in_seconds = length_in_samples / sampling_rate
+        periods = max(1, int(np.ceil(sampling_rate*approximate_length_in_seconds/samples_per_period)))
+        phase, sample_position = _get_profile_sample_positions(x, y, periods, tune, sampling_rate)
+
+        if length_in_samples is None:
+            length_in_samples = int(sample_position[-1])
+        else:
+            # at fixed pitch, the length is nearly proportional to the number
+            # of periods, so choose the fewest periods that cover the requested
+            # length and truncate the rest
+            periods = max(1, int(np.ceil(periods * length_in_samples / sample_position[-1])))
+            phase, sample_position = _get_profile_sample_positions(x, y, periods, tune, sampling_rate)
+            while sample_position[-1] < length_in_samples:
+                periods += 1
+                phase, sample_position = _get_profile_sample_positions(x, y, periods, tune, sampling_rate)
+
+        s.update(samples=len(phase), nbytes=phase.nbytes+sample_position.nbytes)
+
+    with stage('audio.synthesize') as s:
+        # accumulate the phase sample-by-sample and read from the wavetable
+        sample_phase = np.interp(np.arange(length_in_samples), sample_position, phase)
+        audio = np.interp(np.mod(sample_phase, 1.), table_phase, table).astype(np.int16)
+        s.update(samples=len(audio), nbytes=sample_phase.nbytes+audio.nbytes)
 
+    return audio, sampling_rate
 
-    tune = get_tune(tune)
+def _convert_tour_arrays_to_audio(distance,
+                                  elevation,
+                                  max_elevation_difference=0,
+                                  tune='C',
+                                  sampling_rate=44100,
+                                  approximate_length_in_seconds=1,
+                                  set_tune_to_follow_tour_profile=False,
+                                  resampler='cubic',
+                                  length_in_samples=None,
+                                  synthesis='loop',
+                                  ):
+    """
+    Convert the distance/elevation profile of a tour to audio
+    as explained in :func:`komoog.audio.convert_tour_to_audio`.
+    Returns the audio signal only.
+    """
 
-    audios = []
-    for copy in range(copies):
-        this_audio, _ = convert_signal_to_audio(
-                                   x,
-                                   y,
-                                   tune=tune*f(copy),
-                                   sampling_rate=sampling_rate,
-                                   approximate_length_in_seconds=0,
-                                  )
-        audios.append(this_audio)
+    if set_tune_to_follow_tour_profile:
+        audio, _ = convert_distance_and_elevation_to_profile_audio(
+                                                    distance,
+                                                    elevation,
+                                                    max_elevation_difference=max_elevation_difference,
+                                                    tune=tune,
+                                                    sampling_rate=sampling_rate,
+                                                    approximate_length_in_seconds=approximate_length_in_seconds,
+                                                    resampler=resampler,
+                                                    length_in_samples=length_in_samples,
+                                                    validate=False,
+                                                    )
+    else:
+        audio, _ = convert_distance_and_elevation_to_audio(
+                                                distance,
+                                                elevation,
+                                                max_elevation_difference=max_elevation_difference,
+                                                tune=tune,
+                                                sampling_rate=sampling_rate,
+                                                approximate_length_in_seconds=approximate_length_in_seconds,
+                                                resampler=resampler,
+                                                length_in_samples=length_in_samples,
+                                                synthesis=synthesis,
+                                                validate=False,
+                                                )
 
-    return np.concatenate(audios).astype(np.int16), sampling_rate
+    return audio
 
 def convert_tour_to_audio(tour,
                           max_elevation_difference=0,
@@ -344,6 +1119,9 @@ def convert_tour_to_audio(tour,
                           sampling_rate=44100,
                           approximate_length_in_seconds=1,
                           set_tune_to_follow_tour_profile=False,
+                          resampler='cubic',
+                          length_in_samples=None,
+                          synthesis='loop',
                           ):
     """
     Convert a hiking tour to audio.
@@ -379,6 +1157,29 @@ def convert_tour_to_audio(tour,
     set_tune_to_follow_tour_profile : bool, defaukt = False
         If set to ``True`` the tune of the returned audio
         signal will follow the tour profile.
+    resampler : str, default = 'cubic'
+        Method used to resample the smoothed signal to the audio
+        sampling grid. Can be any of
+
+        - ``'cubic'``: cubic spline (:class:`scipy.interpolate.CubicSpline`),
+        - ``'interp1d'``: cubic spline via :class:`scipy.interpolate.interp1d`
+          (slower, kept for reference),
+        - ``'keys'``: cubic convolution kernel without a spline fit,
+        - ``'linear'``: linear interpolation.
+    length_in_samples : int, default = None
+        If given, the audio signal will be exactly this
+        many samples long and ``approximate_length_in_seconds``
+        is ignored.
+    synthesis : str, default = 'loop'
+        How the audio signal is synthesized. Can be any of
+
+        - ``'loop'``: a single period of ``int(sampling_rate/tune)``
+          samples is rendered and repeated,
+        - ``'bandlimited'``: only the waveform's harmonics below the
+          Nyquist frequency are played, at exactly ``tune`` Hz. This
+          avoids aliasing and detuning at high tunes.
+
+        Ignored if ``set_tune_to_follow_tour_profile`` is ``True``.
 
     Returns
     =======
@@ -388,27 +1189,448 @@ def convert_tour_to_audio(tour,
         The sampling rate of the audio signal.
     """
 
-    tracks = convert_tour_to_gpx_tracks(tour)
-    distance, elevation = convert_gpx_tracks_to_arrays(tracks)
+    with stage('audio.convert_tour_to_audio', tour_id=tour.get('id')) as s:
 
-    if set_tune_to_follow_tour_profile:
-        audio, _ = convert_distance_and_elevation_to_profile_audio(
-                                                    distance,
+        distance, elevation = convert_tour_to_arrays(tour)
+        audio = _convert_tour_arrays_to_audio(distance,
+                                              elevation,
+                                              max_elevation_difference=max_elevation_difference,
+                                              tune=tune,
+                                              sampling_rate=sampling_rate,
+                                              approximate_length_in_seconds=approximate_length_in_seconds,
+                                              set_tune_to_follow_tour_profile=set_tune_to_follow_tour_profile,
+                                              resampler=resampler,
+                                              length_in_samples=length_in_samples,
+                                              synthesis=synthesis,
+                                             )
+
+        s.update(points=len(distance), samples=len(audio), nbytes=audio.nbytes)
+
+    return audio, sampling_rate
+
+def iter_signal_audio(x,
+                      y,
+                      tune='C',
+                      sampling_rate=44100,
+                      length_in_samples=None,
+                      chunk_size=1024,
+                      resampler='cubic',
+                      synthesis='loop',
+                      ):
+    """
+    Render a normalized distance/elevation signal as a stream
+    of fixed-size audio chunks. Only a single loop is rendered
+    in advance, such that memory is constant and the first chunk
+    is available after a few milliseconds.
+
+    Parameters
+    ==========
+    x : numpy.ndarray
+        covered distance in range [0,1]
+    y : numpy.ndarray
+        signal in range [-1,1]
+    tune : str or float
+        Desired frequency of the sound, see
+        :func:`komoog.audio.convert_signal_to_audio`.
+    sampling_rate : int, default = 44100
+        Sampling rate in Hz
+    length_in_samples : int, default = None
+        Total number of samples to yield. If ``None``, the stream
+        is endless.
+    chunk_size : int, default = 1024
+        Number of samples per chunk. The last chunk may be shorter.
+    resampler : str, default = 'cubic'
+        See :func:`komoog.audio.convert_signal_to_audio`.
+    synthesis : str, default = 'loop'
+        See :func:`komoog.audio.convert_signal_to_audio`.
+
+    Yields
+    ======
+    chunk : numpy.ndarray of numpy.int16
+        The next ``chunk_size`` samples of the audio signal.
+    """
+
+    if chunk_size < 1:
+        raise ValueError("`chunk_size` has to be a positive integer")
+
+    if synthesis == 'bandlimited':
+        tune = get_tune(tune)
+        table = _get_bandlimited_table(x, y, tune, sampling_rate, resampler)
+        offset = 0
+        while length_in_samples is None or offset < length_in_samples:
+            n = chunk_size if length_in_samples is None else min(chunk_size, length_in_samples-offset)
+            yield _synthesize_bandlimited(table, tune, sampling_rate, offset, n)
+            offset += n
+        return
+    elif synthesis != 'loop':
+        raise ValueError("`synthesis` has to be any of ['loop', 'bandlimited']")
+
+    loop, _ = convert_signal_to_audio(x,
+                                      y,
+                                      tune=tune,
+                                      sampling_rate=sampling_rate,
+                                      approximate_length_in_seconds=0,
+                                      resampler=resampler,
+                                     )
+    period = len(loop)
+
+    # every chunk is a slice of this buffer
+    buffer = tile_audio(loop, chunk_size + period)
+
+    offset = 0
+    remaining = length_in_samples
+
+    while remaining is None or remaining > 0:
+        n = chunk_size if remaining is None else min(chunk_size, remaining)
+        yield buffer[offset:offset+n].copy()
+        offset = (offset + n) % period
+        if remaining is not None:
+            remaining -= n
+
+def iter_tour_audio(tour,
+                    max_elevation_difference=0,
+                    tune='C',
+                    sampling_rate=44100,
+                    length_in_samples=None,
+                    chunk_size=1024,
+                    resampler='cubic',
+                    synthesis='loop',
+                    ):
+    """
+    Render a hiking tour as a stream of fixed-size audio chunks.
+    Pass to a sink from :mod:`komoog.sinks` as
+
+    .. code:: python
+
+        from komoog.sinks import WavFileSink, stream_audio
+
+        chunks = iter_tour_audio(tour, length_in_samples=44100*60)
+        stream_audio(chunks, WavFileSink('tour.wav'), 44100)
+
+    Parameters
+    ==========
+    tour : dict
+        A komoot tour item as provided by e.g.
+        :func:`komoog.io.read_tours`.
+    max_elevation_difference : float, default = 0
+        See :func:`komoog.audio.convert_tour_to_audio`.
+
+    All other parameters are explained in
+    :func:`komoog.audio.iter_signal_audio`.
+
+    Yields
+    ======
+    chunk : numpy.ndarray of numpy.int16
+        The next ``chunk_size`` samples of the audio signal.
+    """
+
+    distance, elevation = convert_tour_to_arrays(tour)
+    x, y = convert_distance_and_elevation_to_signal(distance,
                                                     elevation,
                                                     max_elevation_difference=max_elevation_difference,
-                                                    tune=tune,
-                                                    sampling_rate=sampling_rate,
-                                                    approximate_length_in_seconds=approximate_length_in_seconds,
-                                                    )
+                                                    validate=False,
+                                                   )
+
+    return iter_signal_audio(x,
+                             y,
+                             tune=tune,
+                             sampling_rate=sampling_rate,
+                             length_in_samples=length_in_samples,
+                             chunk_size=chunk_size,
+                             resampler=resampler,
+                             synthesis=synthesis,
+                            )
+
+def _pack_tour(tour):
+    """
+    Replace memory-mapped coordinates by a reference to their file
+    such that worker processes map the file instead of receiving a copy.
+    """
+
+    coordinates = tour.get('coordinates')
+    if isinstance(coordinates, np.memmap) and coordinates.filename is not None:
+        tour = dict(tour)
+        tour['coordinates'] = (_MEMMAP_REFERENCE,
+                               coordinates.filename,
+                               coordinates.dtype,
+                               coordinates.offset,
+                               coordinates.shape,
+                              )
+
+    return tour
+
+def _unpack_tour(tour):
+
+    coordinates = tour.get('coordinates')
+    if isinstance(coordinates, tuple) and coordinates[0] == _MEMMAP_REFERENCE:
+        _, filename, dtype, offset, shape = coordinates
+        tour = dict(tour)
+        tour['coordinates'] = np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    return tour
+
+def _convert_tour_chunk_to_audio(chunk, kwargs):
+    """Render a list of ``(tour_id, tour)`` pairs in a worker process."""
+
+    return [ (tour_id,) + convert_tour_to_audio(_unpack_tour(tour), **kwargs) for tour_id, tour in chunk ]
+
+def convert_tours_to_audio(tours,
+                           max_workers=None,
+                           chunksize=1,
+                           ordered=True,
+                           executor=None,
+                           **kwargs,
+                           ):
+    """
+    Convert many hiking tours to audio in parallel worker processes.
+
+    Parameters
+    ==========
+    tours : iterable of dict
+        komoot tour items as provided by e.g.
+        :func:`komoog.io.read_tours`. Consumed lazily.
+        Memory-mapped coordinates, e.g. from
+        :func:`komoog.io.iter_tours`, are passed to the workers
+        as references to their files.
+    max_workers : int, default = None
+        Number of worker processes. If ``None``, uses the number
+        of processors on the machine. If ``executor`` is given,
+        this should be its number of workers, as it bounds the
+        number of pending chunks.
+    chunksize : int, default = 1
+        Number of tours that are sent to a worker process at once.
+        Larger chunks amortize inter-process communication for
+        short tours.
+    ordered : bool, default = True
+        If ``True``, results are yielded in input order, otherwise
+        in order of completion.
+    executor : concurrent.futures.Executor, default = None
+        An existing executor to submit the work to. If ``None``,
+        a :class:`concurrent.futures.ProcessPoolExecutor` with
+        ``max_workers`` processes is created and shut down afterwards.
+    **kwargs
+        Passed to :func:`komoog.audio.convert_tour_to_audio`, e.g.
+        ``tune``, ``sampling_rate``, or ``approximate_length_in_seconds``.
+
+    Yields
+    ======
+    tour_id : int or str
+        The tour's ``'id'`` entry or, if it does not exist,
+        its position in ``tours``.
+    audio : numpy.ndarray of numpy.int16
+        The transformed audio signal
+    sampling_rate : int
+        The sampling rate of the audio signal.
+    """
+
+    if chunksize < 1:
+        raise ValueError("`chunksize` has to be a positive integer")
+
+    tours = ( (tour.get('id', i), _pack_tour(tour)) for i, tour in enumerate(tours) )
+    chunks = iter(lambda: list(islice(tours, chunksize)), [])
+
+    yield from _iter_chunk_results(_convert_tour_chunk_to_audio,
+                                   chunks,
+                                   kwargs,
+                                   workers=max_workers or os.cpu_count() or 1,
+                                   ordered=ordered,
+                                   executor=executor,
+                                  )
+
+def _iter_chunk_results(func, chunks, kwargs, workers, ordered=True, executor=None):
+    """
+    Call ``func(chunk, kwargs)`` for every chunk in ``workers`` worker
+    processes and yield the entries of the returned lists. At most two
+    chunks per worker are pending, such that ``chunks`` is consumed
+    lazily. See :func:`komoog.audio.convert_tours_to_audio` for the
+    remaining parameters.
+    """
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    max_pending = 2 * workers
+
+    pending = deque()
+    try:
+        for chunk in islice(chunks, max_pending):
+            pending.append(executor.submit(func, chunk, kwargs))
+
+        while len(pending) > 0:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+
+            for chunk in islice(chunks, len(done)):
+                pending.append(executor.submit(func, chunk, kwargs))
+
+            for future in done:
+                yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+
+def _get_pan_weights(pans, num_channels):
+    """
+    Return the constant-power weights of shape
+    ``(len(pans), num_channels)`` with which sources at positions
+    ``pans`` in range [-1,1] are distributed to channels that are
+    arranged linearly from ``-1`` to ``1``.
+    """
+
+    pans = np.asarray(pans, dtype=float)
+    weights = np.zeros((len(pans), num_channels))
+
+    if num_channels == 1:
+        weights[:] = 1.
+        return weights
+
+    position = (np.clip(pans, -1., 1.) + 1.) / 2. * (num_channels - 1)
+    lower = np.minimum(np.floor(position).astype(int), num_channels - 2)
+    fraction = position - lower
+    rows = np.arange(len(pans))
+    weights[rows, lower] = np.cos(0.5 * np.pi * fraction)
+    weights[rows, lower+1] = np.sin(0.5 * np.pi * fraction)
+
+    return weights
+
+def mix_tours_to_audio(tours,
+                       num_channels=2,
+                       gains=None,
+                       tunes='C',
+                       pans=None,
+                       max_elevation_difference=0,
+                       sampling_rate=44100,
+                       approximate_length_in_seconds=1,
+                       resampler='cubic',
+                       length_in_samples=None,
+                       block_size=65536,
+                       ):
+    """
+    Render several hiking tours simultaneously into a single
+    multi-channel audio signal, e.g. to compare routes in stereo.
+
+    A single loop is rendered per tour. The loops are then mixed
+    block by block into one preallocated array of shape
+    ``(samples, num_channels)``, such that no full-length
+    render of a single tour is ever held in memory.
+
+    Parameters
+    ==========
+    tours : list of dict
+        komoot tour items as provided by e.g.
+        :func:`komoog.io.read_tours`.
+    num_channels : int, default = 2
+        Number of output channels.
+    gains : float or list of float, default = None
+        Gain per tour. If ``None``, all tours have equal gain and
+        the mix is scaled such that no channel can clip.
+    tunes : str, float, or list, default = 'C'
+        Tune per tour, see :func:`komoog.audio.convert_signal_to_audio`.
+    pans : float or list of float, default = None
+        Position per tour in range [-1,1], where ``-1`` is the first
+        and ``1`` the last channel. Sources between two channels are
+        distributed with constant power. If ``None``, tours are spread
+        evenly, i.e. with as many tours as channels, every tour is
+        played on its own channel.
+    max_elevation_difference : float, default = 0
+        See :func:`komoog.audio.convert_tour_to_audio`.
+    sampling_rate : int, default = 44100
+        Sampling rate in Hz
+    approximate_length_in_seconds : float, default = 1.
+        The desired length of the audio signal in seconds
+    resampler : str, default = 'cubic'
+        See :func:`komoog.audio.convert_signal_to_audio`.
+    length_in_samples : int, default = None
+        If given, the audio signal will be exactly this
+        many samples long and ``approximate_length_in_seconds``
+        is ignored.
+    block_size : int, default = 65536
+        Number of samples that are mixed at once.
+
+    Returns
+    =======
+    audio : numpy.ndarray of numpy.int16
+        The interleaved audio signal of shape ``(samples, num_channels)``.
+        Pass to :func:`komoog.audio.play_audio` or
+        :func:`komoog.io.write_wav` directly.
+    sampling_rate : int
+        The sampling rate of the audio signal.
+
+    Raises
+    ======
+    ValueError
+        If ``tours`` is empty or a per-tour parameter doesn't
+        have one entry per tour.
+    """
+
+    number_of_tours = len(tours)
+    if number_of_tours == 0:
+        raise ValueError("at least one tour is required")
+
+    def per_tour(value, name):
+        if isinstance(value, str) or np.ndim(value) == 0:
+            return [value] * number_of_tours
+        value = list(value)
+        if len(value) != number_of_tours:
+            raise ValueError(f"`{name}` needs one entry per tour")
+        return value
+
+    tunes = per_tour(tunes, 'tunes')
+
+    if pans is None:
+        pans = np.linspace(-1, 1, number_of_tours) if number_of_tours > 1 else [0.]
+    weights = _get_pan_weights(per_tour(pans, 'pans'), num_channels)
+
+    if gains is None:
+        weights /= max(1., np.max(np.sum(weights, axis=0)))
     else:
-        audio, _ = convert_distance_and_elevation_to_audio(
-                                                distance,
-                                                elevation,
-                                                max_elevation_difference=max_elevation_difference,
-                                                tune=tune,
-                                                sampling_rate=sampling_rate,
-                                                approximate_length_in_seconds=approximate_length_in_seconds,
-                                                )
+        weights *= np.array(per_tour(gains, 'gains'), dtype=float)[:,None]
+
+    loops = []
+    for tour, tune in zip(tours, tunes):
+        distance, elevation = convert_tour_to_arrays(tour)
+        x, y = convert_distance_and_elevation_to_signal(distance,
+                                                        elevation,
+                                                        max_elevation_difference=max_elevation_difference,
+                                                        validate=False,
+                                                       )
+        loop, _ = convert_signal_to_audio(x,
+                                          y,
+                                          tune=tune,
+                                          sampling_rate=sampling_rate,
+                                          approximate_length_in_seconds=0,
+                                          resampler=resampler,
+                                         )
+        loops.append(loop)
+
+    if length_in_samples is None:
+        length_in_samples = int(np.ceil(sampling_rate * approximate_length_in_seconds))
+
+    with stage('audio.mix', tours=number_of_tours, channels=num_channels) as s:
+
+        audio = np.empty((length_in_samples, num_channels), dtype=np.int16)
+        mix = np.empty((min(block_size, length_in_samples), num_channels))
+        t = np.arange(len(mix))
+
+        for start in range(0, length_in_samples, block_size):
+            n = min(block_size, length_in_samples - start)
+            block = mix[:n]
+            block[:] = 0.
+            for loop, weight in zip(loops, weights):
+                # the loop's samples at times `start` to `start+n`
+                samples = loop.take(t[:n] + start % len(loop), mode='wrap')
+                block += samples[:,None] * weight
+            np.clip(np.round(block), -32768, 32767, out=block)
+            audio[start:start+n] = block
+
+        s.update(samples=length_in_samples, nbytes=audio.nbytes+mix.nbytes)
 
     return audio, sampling_rate
 
@@ -418,6 +1640,8 @@ if __name__=="__main__":
     import simpleaudio as sa
     import matplotlib.pyplot as pl
 
+    from komoog.gpx import convert_gpx_tracks_to_arrays
+
     from scipy.io import wavfile
 
     fn = '/Users/bfmaier/Downloads/Tour.gpx'
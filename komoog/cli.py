@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line interface.
+
+.. code:: bash
+
+    komoog render --output-dir wavs --workers 4 --tune A --length 2
+    komoog render --gpx tours/*.gpx --output-dir wavs --format flac
+
+Outputs that are up to date according to the manifest in the
+output directory are skipped, such that interrupted jobs resume
+where they stopped.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from time import perf_counter
+
+from komoog.metadata import __version__
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+def _convert_source_to_audio(source, **kwargs):
+    """
+    Render a tour or a gpx file given by its path, see
+    :func:`komoog.audio.convert_tour_to_audio`. The segments of a
+    gpx file are joined like in
+    :func:`komoog.gpx.convert_segments_to_arrays`.
+    """
+
+    from komoog.audio import convert_tour_to_audio, _unpack_tour, _convert_tour_arrays_to_audio
+
+    if isinstance(source, dict):
+        return convert_tour_to_audio(_unpack_tour(source), **kwargs)
+
+    from komoog.io import read_gpx_arrays
+    from komoog.gpx import convert_segments_to_arrays
+
+    distance, elevation = convert_segments_to_arrays(read_gpx_arrays(source))
+
+    return _convert_tour_arrays_to_audio(distance, elevation, **kwargs), kwargs.get('sampling_rate', 44100)
+
+def _pack_source(source):
+    """Pass memory-mapped coordinates to worker processes by reference."""
+
+    from komoog.audio import _pack_tour
+
+    if isinstance(source, dict):
+        return _pack_tour(source)
+
+    return source
+
+def _convert_source_chunk_to_audio(chunk, kwargs):
+    """Render a list of ``(tour_id, source)`` pairs in a worker process."""
+
+    return [ (tour_id,) + _convert_source_to_audio(source, **kwargs) for tour_id, source in chunk ]
+
+def _hash_file(fn):
+
+    h = hashlib.sha1()
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+def get_sources(gpx_files=None, directory=None, tour_ids=None):
+    """
+    Collect the tours to render without loading their coordinates.
+
+    Parameters
+    ==========
+    gpx_files : list of str, default = None
+        Paths to gpx files. If ``None``, tours are taken from the
+        local tour store.
+    directory : str or pathlib.Path, default = None
+        Directory of the tour store, see :func:`komoog.io.read_tour_index`.
+    tour_ids : list, default = None
+        Only render tours with these ids.
+
+    Returns
+    =======
+    sources : list of tuple
+        Entries ``(tour_id, fingerprint, load)`` where ``fingerprint``
+        is a string that changes whenever the tour changes and
+        ``load()`` returns the tour or, for gpx files, the path
+        of the file, which is read by the worker process. The
+        ``tour_id`` of a gpx file is its name without suffix.
+
+    Raises
+    ======
+    ValueError
+        If gpx files share a name, as their outputs would collide.
+    OSError
+        If a gpx file can't be read or the tour store doesn't exist.
+    """
+
+    sources = []
+
+    if gpx_files:
+        paths = {}
+        for fn in gpx_files:
+            paths.setdefault(Path(fn).stem, []).append(str(fn))
+        duplicates = [ ', '.join(fns) for fns in paths.values() if len(fns) > 1 ]
+        if duplicates:
+            raise ValueError("gpx files with the same name would be rendered to the same output: " + '; '.join(duplicates))
+
+        for fn in gpx_files:
+            tour_id = Path(fn).stem
+            sources.append((tour_id, _hash_file(fn), lambda fn=fn: str(fn)))
+    else:
+        from komoog.io import read_tour_index, read_tour
+
+        for entry in read_tour_index(directory):
+            tour_id = entry['id']
+            sources.append((tour_id,
+                            json.dumps(entry, sort_keys=True, default=str),
+                            lambda tour_id=tour_id: read_tour(tour_id, directory=directory, coordinates_as_array=True),
+                          ))
+
+    if tour_ids is not None:
+        tour_ids = set(str(tour_id) for tour_id in tour_ids)
+        sources = [ source for source in sources if str(source[0]) in tour_ids ]
+
+    return sources
+
+def get_render_hash(fingerprint, parameters):
+    """Return a hash of a tour's fingerprint and the render parameters."""
+
+    h = hashlib.sha1()
+    h.update(fingerprint.encode())
+    h.update(json.dumps(parameters, sort_keys=True).encode())
+    h.update(__version__.encode())
+
+    return h.hexdigest()
+
+def read_manifest(output_dir):
+    """
+    Read the manifest of rendered outputs in ``output_dir`` as a
+    dict that maps output file names to render hashes. Lines that
+    were only partially written, e.g. after a crash, are ignored.
+    """
+
+    manifest = {}
+    fn = Path(output_dir) / MANIFEST_NAME
+
+    if fn.exists():
+        with open(fn) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                manifest[entry['output']] = entry['hash']
+
+    return manifest
+
+def _write_manifest(output_dir, manifest):
+    """Rewrite the manifest with a single line per output."""
+
+    fn = Path(output_dir) / MANIFEST_NAME
+    tmp = fn.with_name(fn.name + '.tmp')
+    with open(tmp, 'w') as f:
+        for output, render_hash in sorted(manifest.items()):
+            f.write(json.dumps({'output': output, 'hash': render_hash}) + '\n')
+    os.replace(tmp, fn)
+
+def render(sources,
+           output_dir,
+           workers=None,
+           audio_format='wav',
+           force=False,
+           log=None,
+           **kwargs,
+           ):
+    """
+    Render tours to audio files, skipping outputs that are
+    up to date according to the manifest in ``output_dir``.
+
+    Parameters
+    ==========
+    sources : list of tuple
+        As returned by :func:`komoog.cli.get_sources`.
+    output_dir : str or pathlib.Path
+        Directory of the audio files and the manifest.
+    workers : int, default = None
+        Number of worker processes, see
+        :func:`komoog.audio.convert_tours_to_audio`. If ``0``,
+        tours are rendered in this process.
+    audio_format : str, default = 'wav'
+        Either ``'wav'`` or ``'flac'``.
+    force : bool, default = False
+        Render all tours, even if their outputs are up to date.
+    log : file-like, default = None
+        Stream for progress messages. If ``None``, nothing is printed.
+    **kwargs
+        Passed to :func:`komoog.audio.convert_tour_to_audio`.
+
+    Returns
+    =======
+    stats : dict
+        Number of ``'rendered'`` and ``'skipped'`` tours, the
+        ``'wall_time'`` in seconds, ``'tours_per_second'``, and the
+        rendered ``'audio_seconds_per_second'``.
+    """
+
+    from komoog.io import open_audio_writer
+    from komoog.audio import _iter_chunk_results
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    parameters = dict(kwargs, format=audio_format)
+
+    # compacting drops lines that an interrupted job left incomplete
+    manifest = read_manifest(output_dir)
+    _write_manifest(output_dir, manifest)
+
+    todo = {}
+    skipped = 0
+    for tour_id, fingerprint, load in sources:
+        output = f'{tour_id}.{audio_format}'
+        render_hash = get_render_hash(fingerprint, parameters)
+        if not force and manifest.get(output) == render_hash and (output_dir / output).exists():
+            skipped += 1
+        else:
+            todo[str(tour_id)] = (output, render_hash, load)
+
+    jobs = ( (tour_id, _pack_source(load())) for tour_id, (_, _, load) in todo.items() )
+    if workers == 0:
+        results = ( (tour_id,) + _convert_source_to_audio(source, **kwargs) for tour_id, source in jobs )
+    else:
+        results = _iter_chunk_results(_convert_source_chunk_to_audio,
+                                      ( [job] for job in jobs ),
+                                      kwargs,
+                                      workers=workers or os.cpu_count() or 1,
+                                      ordered=False,
+                                     )
+
+    rendered = 0
+    audio_seconds = 0.
+    t0 = perf_counter()
+
+    with open(output_dir / MANIFEST_NAME, 'a') as manifest_file:
+        for tour_id, audio, sampling_rate in results:
+            output, render_hash, _ = todo[str(tour_id)]
+
+            # write to a temporary file first, such that an interrupted
+            # write never leaves a complete-looking output behind
+            tmp = output_dir / (output + '.tmp')
+            with open_audio_writer(tmp, sampling_rate, format=audio_format) as writer:
+                writer.write(audio)
+            os.replace(tmp, output_dir / output)
+
+            manifest_file.write(json.dumps({'output': output, 'hash': render_hash}) + '\n')
+            manifest_file.flush()
+            manifest[output] = render_hash
+
+            rendered += 1
+            audio_seconds += len(audio) / sampling_rate
+            if log is not None:
+                print(f'[{rendered}/{len(todo)}] {output}', file=log)
+
+    wall_time = perf_counter() - t0
+    _write_manifest(output_dir, manifest)
+
+    return {
+            'rendered': rendered,
+            'skipped': skipped,
+            'wall_time': wall_time,
+            'tours_per_second': rendered / wall_time if wall_time > 0 else 0.,
+            'audio_seconds_per_second': audio_seconds / wall_time if wall_time > 0 else 0.,
+           }
+
+def _parse_tune(tune):
+
+    try:
+        return float(tune)
+    except ValueError:
+        return tune
+
+def get_parser():
+
+    parser = argparse.ArgumentParser(prog='komoog', description='Convert komoot hiking trips to sounds.')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    p = subparsers.add_parser('render',
+                              help='render tours to audio files',
+                              description='Render tours from the local tour store or gpx files to audio files. '
+                                          'Outputs that are up to date are skipped.')
+    p.add_argument('--gpx', nargs='+', metavar='FILE', help='render these gpx files instead of the local tour store')
+    p.add_argument('--store', default=None, metavar='DIR', help='directory of the tour store (default: ~/.komoog/tours)')
+    p.add_argument('--tour-ids', nargs='+', metavar='ID', help='only render tours with these ids')
+    p.add_argument('-o', '--output-dir', required=True, metavar='DIR', help='directory of the audio files')
+    p.add_argument('-j', '--workers', type=int, default=None,
+                   help='number of worker processes (default: number of processors, 0: no worker processes)')
+    p.add_argument('--format', dest='audio_format', choices=['wav', 'flac'], default='wav')
+    p.add_argument('--tune', type=_parse_tune, default='C', help="note name like 'A' or frequency in Hz (default: C)")
+    p.add_argument('--sampling-rate', type=int, default=44100)
+    p.add_argument('--length', type=float, default=1., help='approximate length in seconds (default: 1)')
+    p.add_argument('--max-elevation-difference', type=float, default=0.)
+    p.add_argument('--profile', action='store_true', help='let the tune follow the tour profile')
+    p.add_argument('--resampler', choices=['cubic', 'interp1d', 'keys', 'linear'], default='cubic')
+    p.add_argument('--synthesis', choices=['loop', 'bandlimited'], default='loop')
+    p.add_argument('--force', action='store_true', help='render all tours, even if their outputs are up to date')
+    p.add_argument('-q', '--quiet', action='store_true', help='only print the summary')
+
+    return parser
+
+def main(argv=None):
+    """Entry point of the ``komoog`` console script."""
+
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'render':
+
+        try:
+            sources = get_sources(gpx_files=args.gpx, directory=args.store, tour_ids=args.tour_ids)
+        except (ValueError, OSError) as e:
+            parser.error(str(e))
+
+        stats = render(sources,
+                       args.output_dir,
+                       workers=args.workers,
+                       audio_format=args.audio_format,
+                       force=args.force,
+                       log=None if args.quiet else sys.stderr,
+                       max_elevation_difference=args.max_elevation_difference,
+                       tune=args.tune,
+                       sampling_rate=args.sampling_rate,
+                       approximate_length_in_seconds=args.length,
+                       set_tune_to_follow_tour_profile=args.profile,
+                       resampler=args.resampler,
+                       synthesis=args.synthesis,
+                      )
+
+        print(f"rendered {stats['rendered']} tours, skipped {stats['skipped']} up-to-date tours "
+              f"in {stats['wall_time']:.2f}s ({stats['tours_per_second']:.1f} tours/s, "
+              f"{stats['audio_seconds_per_second']:.1f} s of audio per second)")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,78 @@ GPX file handling.
 """
 
 import numpy as np
-import gpxpy
 
-def convert_gpx_tracks_to_arrays(gpx_tracks):
+from komoog.instrument import stage
+
+EARTH_RADIUS = 6378137.0 # m, same as gpxpy.geo.EARTH_RADIUS
+ONE_DEGREE = 2 * np.pi * EARTH_RADIUS / 360. # m
+
+def compute_distance_2d(latitude, longitude, haversine=False):
     """
-    Take a list of gpx Track objects and convert them
-    to two arrays, one containing the two-dimensional distance
-    covered on the globe, the second containing the elevation.
+    Compute the two-dimensional distances between consecutive
+    points of a track in a single vectorized pass.
+
+    Mirrors :func:`gpxpy.geo.distance` (without elevation), i.e.
+    uses the equirectangular approximation for neighboring points
+    and the haversine formula for points that are more than
+    0.2 degrees apart. Results agree with
+    ``gpxpy.gpx.GPXTrackPoint.distance_2d`` to a relative tolerance
+    of ``1e-9``.
 
     Parameters
     ==========
-    gpx_tracks : list of gpx.Track
-        list of tracks to convert
+    latitude : numpy.ndarray
+        Latitudes of the track points in degrees.
+    longitude : numpy.ndarray
+        Longitudes of the track points in degrees.
+    haversine : bool, default = False
+        If ``True``, use the haversine formula for every pair of points.
+
+    Returns
+    =======
+    distance : numpy.ndarray
+        Array of length ``len(latitude)-1`` containing the distance
+        in meters between point ``i`` and point ``i+1``.
+    """
+
+    lat = np.asarray(latitude, dtype=float)
+    lon = np.asarray(longitude, dtype=float)
+
+    lat1 = lat[:-1]
+    lat2 = lat[1:]
+    d_lat = lat1 - lat2
+    d_lon = lon[:-1] - lon[1:]
+
+    # equirectangular approximation, like gpxpy
+    coef = np.cos(np.radians(lat1))
+    distance = np.hypot(d_lat, d_lon * coef) * ONE_DEGREE
+
+    if haversine:
+        far = slice(None)
+    else:
+        far = (np.abs(d_lat) > .2) | (np.abs(d_lon) > .2)
+        if not np.any(far):
+            return distance
+
+    rlat1 = np.radians(lat1[far])
+    rlat2 = np.radians(lat2[far])
+    a = np.sin((rlat1 - rlat2)/2)**2 + \
+        np.sin(np.radians(d_lon[far])/2)**2 * np.cos(rlat1) * np.cos(rlat2)
+    distance[far] = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+    return distance
+
+def convert_segments_to_arrays(segments):
+    """
+    Take a list of track segments given as coordinate arrays and
+    convert them to two arrays, one containing the two-dimensional
+    distance covered on the globe, the second containing the elevation.
+
+    Parameters
+    ==========
+    segments : list of tuple of numpy.ndarray
+        Each entry is a tuple ``(latitude, longitude, elevation, ...)``
+        of equally long arrays. Further entries are ignored.
 
     Returns
     =======
@@ -25,33 +85,28 @@ def convert_gpx_tracks_to_arrays(gpx_tracks):
         Contains the corresponding elevation profile in meters
     """
 
-    all_points = []
+    with stage('gpx.distance') as s:
+        distance, elevation = _convert_segments_to_arrays(segments)
+        s.update(points=len(distance), nbytes=distance.nbytes+elevation.nbytes)
+
+    return distance, elevation
 
-    for track in gpx_tracks:
-        for segment in track.segments:
-            these_points = []
-            for point in segment.points:
-                these_points.append(point)
-            all_points.append(these_points)
+def _convert_segments_to_arrays(segments):
 
     distance = []
     elevation = []
 
-    for points in all_points:
-
-        this_distance = [0.]
-        this_elevation = [points[0].elevation]
+    for segment in segments:
 
-        for A, B in zip(points[:-1], points[1:]):
-            d = A.distance_2d(B)
-            this_distance.append(d+this_distance[-1])
-            this_elevation.append(B.elevation)
+        lat, lon, ele = segment[:3]
 
-        this_distance = np.array(this_distance)
-        this_elevation = np.array(this_elevation)
+        this_distance = np.empty(len(lat))
+        this_distance[0] = 0.
+        np.cumsum(compute_distance_2d(lat, lon), out=this_distance[1:])
+        this_elevation = np.asarray(ele, dtype=float)
 
         if len(distance) > 0:
-            d = np.array(distance[-1])
+            d = distance[-1]
             offset = d[-1] + np.mean(d[1:]-d[:-1])
         else:
             offset = 0.
@@ -59,7 +114,6 @@ def convert_gpx_tracks_to_arrays(gpx_tracks):
         distance.append(this_distance + offset)
         elevation.append(this_elevation)
 
-
     if len(distance) > 1:
         distance = np.concatenate(distance)
         elevation = np.concatenate(elevation)
@@ -73,8 +127,45 @@ def convert_gpx_tracks_to_arrays(gpx_tracks):
 
     return distance[ndx], elevation[ndx]
 
+def convert_gpx_tracks_to_arrays(gpx_tracks):
+    """
+    Take a list of gpx Track objects and convert them
+    to two arrays, one containing the two-dimensional distance
+    covered on the globe, the second containing the elevation.
+
+    Parameters
+    ==========
+    gpx_tracks : list of gpx.Track
+        list of tracks to convert
+
+    Returns
+    =======
+    distance : numpy.ndarray
+        Contains the covered 2D distance in meters.
+    elevation : numpy.ndarray
+        Contains the corresponding elevation profile in meters
+    """
+
+    segments = []
+
+    with stage('gpx.coordinates') as s:
+        for track in gpx_tracks:
+            for segment in track.segments:
+                points = segment.points
+                n = len(points)
+                lat = np.fromiter((p.latitude for p in points), dtype=float, count=n)
+                lon = np.fromiter((p.longitude for p in points), dtype=float, count=n)
+                ele = np.array([p.elevation for p in points], dtype=float)
+                segments.append((lat, lon, ele))
+        s.update(points=sum(len(segment[0]) for segment in segments),
+                 nbytes=sum(3*segment[0].nbytes for segment in segments))
+
+    return convert_segments_to_arrays(segments)
+
 def convert_tour_to_gpx_tracks(tour):
 
+    import gpxpy.gpx
+
     seg = gpxpy.gpx.GPXTrackSegment()
 
     for point in tour['coordinates']:
@@ -85,8 +176,85 @@ def convert_tour_to_gpx_tracks(tour):
 
     return [gpx_track]
 
+def convert_tour_to_coordinate_arrays(tour):
+    """
+    Convert the coordinates of a komoot tour to contiguous
+    arrays without constructing intermediate point objects.
+
+    Parameters
+    ==========
+    tour : dict
+        A komoot tour item as provided by e.g.
+        :func:`komoog.io.read_tours`. The coordinates can either
+        be a list of dicts or a structured array with fields
+        ``'lat'``, ``'lng'``, and ``'alt'``, in which case the
+        returned arrays are views on it.
+
+    Returns
+    =======
+    latitude : numpy.ndarray
+        Latitudes of the tour's points in degrees.
+    longitude : numpy.ndarray
+        Longitudes of the tour's points in degrees.
+    elevation : numpy.ndarray
+        Elevation of the tour's points in meters.
+    """
+
+    coordinates = tour['coordinates']
+
+    if isinstance(coordinates, np.ndarray) and coordinates.dtype.names is not None:
+        return coordinates['lat'], coordinates['lng'], coordinates['alt']
+
+    n = len(coordinates)
+
+    data = np.fromiter((point[key] for point in coordinates
+                                   for key in ('lat', 'lng', 'alt')),
+                       dtype=float,
+                       count=3*n,
+                      ).reshape(n, 3)
+
+    latitude = np.ascontiguousarray(data[:,0])
+    longitude = np.ascontiguousarray(data[:,1])
+    elevation = np.ascontiguousarray(data[:,2])
+
+    return latitude, longitude, elevation
+
+def convert_tour_to_arrays(tour):
+    """
+    Convert a komoot tour directly to two arrays, one containing
+    the two-dimensional distance covered on the globe, the second
+    containing the elevation. Equivalent to
+
+    .. code:: python
+
+        convert_gpx_tracks_to_arrays(convert_tour_to_gpx_tracks(tour))
+
+    but skips the construction of ``gpxpy`` objects.
+
+    Parameters
+    ==========
+    tour : dict
+        A komoot tour item as provided by e.g.
+        :func:`komoog.io.read_tours`.
+
+    Returns
+    =======
+    distance : numpy.ndarray
+        Contains the covered 2D distance in meters.
+    elevation : numpy.ndarray
+        Contains the corresponding elevation profile in meters
+    """
+
+    with stage('gpx.coordinates') as s:
+        coordinates = convert_tour_to_coordinate_arrays(tour)
+        s.update(points=len(coordinates[0]), nbytes=sum(a.nbytes for a in coordinates))
+
+    return convert_segments_to_arrays([coordinates])
+
 if __name__=="__main__":
 
+    import gpxpy
+
     with open('/Users/bfmaier/Downloads/Tour.gpx','r') as gpx_file:
         gpx = gpxpy.parse(gpx_file)
 
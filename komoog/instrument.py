@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in instrumentation of the render pipeline.
+
+Functions in :mod:`komoog.gpx` and :mod:`komoog.audio` report
+their stages (wall time, number of points, number of output
+samples, and the size of the allocated arrays) to all active
+recorders. Without an active recorder, a stage is a shared no-op
+object, such that instrumentation costs a single function call.
+
+.. code:: python
+
+    from komoog.instrument import Recorder
+
+    with Recorder() as recorder:
+        audio, sampling_rate = convert_tour_to_audio(tour)
+
+    recorder.write_jsonl('stages.jsonl')
+
+Stages that run in worker processes, e.g. in
+:func:`komoog.audio.convert_tours_to_audio`, are not recorded.
+"""
+
+import json
+import threading
+from time import perf_counter
+
+_recorders = []
+_local = threading.local()
+
+class _NullStage():
+    """A stage that does nothing, used while no recorder is active."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def update(self, **info):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage():
+    """A timed stage that reports to all active recorders on exit."""
+
+    __slots__ = ('name', 'info', 'parent', '_t0')
+
+    def __init__(self, name, info):
+
+        self.name = name
+        self.info = info
+        self.parent = None
+
+    def __enter__(self):
+
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack:
+            self.parent = stack[-1].name
+        stack.append(self)
+        self._t0 = perf_counter()
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        wall_time = perf_counter() - self._t0
+        _local.stack.pop()
+
+        record = {
+                    'stage': self.name,
+                    'parent': self.parent,
+                    'wall_time': wall_time,
+                 }
+        record.update(self.info)
+
+        for recorder in list(_recorders):
+            recorder.add(record)
+
+        return False
+
+    def update(self, **info):
+        """Add information to the stage's record, e.g. ``samples=len(audio)``."""
+        self.info.update(info)
+
+def stage(name, **info):
+    """
+    Time a stage of the render pipeline.
+
+    Parameters
+    ==========
+    name : str
+        Name of the stage, e.g. ``'audio.smooth'``.
+    **info
+        Additional information to report, e.g. ``points=len(x)``.
+
+    Returns
+    =======
+    stage : context manager
+        Its ``update(**info)`` method adds further information.
+        If no recorder is active, a shared no-op object is returned.
+    """
+
+    if not _recorders:
+        return _NULL_STAGE
+
+    return _Stage(name, info)
+
+def is_enabled():
+    """Return whether a recorder is active."""
+    return len(_recorders) > 0
+
+class Recorder():
+    """
+    Collect the records of all stages that finish while the
+    recorder is active (i.e. inside its ``with``-block).
+
+    Parameters
+    ==========
+    callback : callable, default = None
+        If given, called with each record (a dict with keys
+        ``'stage'``, ``'parent'``, ``'wall_time'`` in seconds,
+        and stage-specific information such as ``'points'``,
+        ``'samples'``, and ``'nbytes'``).
+    """
+
+    def __init__(self, callback=None):
+
+        self.callback = callback
+        self.records = []
+
+    def __enter__(self):
+
+        _recorders.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+
+        _recorders.remove(self)
+        return False
+
+    def add(self, record):
+
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self):
+        """
+        Aggregate the records per stage.
+
+        Returns
+        =======
+        summary : dict
+            Maps stage names to dicts with keys ``'calls'``
+            and ``'wall_time'`` (total, in seconds).
+        """
+
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault(record['stage'], {'calls': 0, 'wall_time': 0.})
+            entry['calls'] += 1
+            entry['wall_time'] += record['wall_time']
+
+        return summary
+
+    def write_jsonl(self, fn):
+        """Write all records to ``fn`` as JSON lines."""
+        write_jsonl(self.records, fn)
+
+def write_jsonl(records, fn):
+    """
+    Write stage records as JSON lines.
+
+    Parameters
+    ==========
+    records : list of dict
+        As collected by :class:`komoog.instrument.Recorder`.
+    fn : str, pathlib.Path, or file-like
+        A path or an open text stream.
+    """
+
+    if hasattr(fn, 'write'):
+        for record in records:
+            fn.write(json.dumps(record) + '\n')
+    else:
+        with open(fn, 'w') as f:
+            write_jsonl(records, f)
@@ -3,31 +3,340 @@
 File I/O.
 """
 
+import os
 import pathlib
 from pathlib import Path
+from array import array
+from datetime import timezone
+from xml.etree.ElementTree import iterparse
 import simplejson as json
 from komoog.paths import customdir
-from scipy.io import wavfile
-import gpxpy
+import numpy as np
 
 tour_file = customdir / "tours.json"
+tour_dir = customdir / "tours"
 
-def read_tours():
-    """Read downloaded tours from ``~/.komoog/tours.json``"""
+_COORDINATE_FIELDS = ('lat', 'lng', 'alt', 't')
+_REQUIRED_COORDINATE_FIELDS = ('lat', 'lng', 'alt')
+_INDEX_FIELDS = ('id', 'name', 'sport', 'date', 'changed_at', 'distance', 'duration', 'elevation_up', 'elevation_down')
 
-    if not tour_file.exists():
+def _write_json_atomic(fn, data):
+    """Write json data to a temporary file and move it to ``fn``."""
+
+    tmp = fn.with_name(fn.name + '.tmp')
+    with open(tmp,'w') as f:
+        json.dump(data,f)
+    os.replace(tmp, fn)
+
+def _get_coordinate_fields(coordinates):
+    """Return the coordinate fields to store, optional ones only if present."""
+
+    if isinstance(coordinates, np.ndarray):
+        present = set(coordinates.dtype.names or ())
+        return tuple(field for field in _COORDINATE_FIELDS
+                           if field in _REQUIRED_COORDINATE_FIELDS or field in present)
+
+    return tuple(field for field in _COORDINATE_FIELDS
+                       if field in _REQUIRED_COORDINATE_FIELDS or any(field in point for point in coordinates))
+
+def _convert_coordinates_to_array(coordinates):
+    """
+    Convert komoot coordinates, given as a list of dicts or
+    as a structured array, to a structured float64 array.
+    """
+
+    fields = _get_coordinate_fields(coordinates)
+    dtype = np.dtype([ (field, np.float64) for field in fields ])
+
+    if isinstance(coordinates, np.ndarray):
+        data = np.empty(len(coordinates), dtype=dtype)
+        for field in fields:
+            data[field] = coordinates[field]
+        return data
+
+    n = len(coordinates)
+    data = np.fromiter((point.get(field, np.nan) for point in coordinates
+                                                 for field in fields),
+                       dtype=np.float64,
+                       count=len(fields)*n,
+                      )
+
+    return data.view(dtype)
+
+def _convert_array_to_coordinates(array):
+    """
+    Convert a structured coordinate array to a list of komoot
+    coordinate dicts. Optional fields are left out where missing.
+    """
+
+    fields = array.dtype.names
+    optional = [ field for field in fields if field not in _REQUIRED_COORDINATE_FIELDS ]
+
+    if not optional:
+        return [ dict(zip(fields, row)) for row in array.tolist() ]
+
+    return [ { field: value for field, value in zip(fields, row)
+                            if field not in optional or value == value }
+             for row in array.tolist() ]
+
+def _get_index_entry(tour, coordinates):
+    """Summarize a tour for the tour index."""
+
+    entry = { key: tour[key] for key in _INDEX_FIELDS if key in tour }
+    entry['number_of_points'] = len(coordinates)
+    if len(coordinates) > 0:
+        entry['min_alt'] = float(np.nanmin(coordinates['alt']))
+        entry['max_alt'] = float(np.nanmax(coordinates['alt']))
+
+    return entry
+
+def write_tour(tour, directory=None):
+    """
+    Write a single tour to the tour store in ``~/.komoog/tours/``
+    and add it to the store's index. The tour's metadata is saved
+    as ``<id>.json``, its coordinates as a structured array
+    ``<id>.npy``.
+
+    Parameters
+    ==========
+    tour : dict
+        A komoot tour item including its coordinates, given
+        as a list of dicts or as a structured array as returned
+        by :func:`komoog.io.read_tour`.
+    directory : pathlib.Path, default = None
+        The store directory. Defaults to ``~/.komoog/tours/``.
+
+    Returns
+    =======
+    entry : dict
+        The tour's index entry.
+    """
+
+    return update_tours([tour], directory=directory)[0]
+
+def update_tours(tours=(), deleted_ids=(), directory=None):
+    """
+    Write and delete several tours in the tour store in
+    ``~/.komoog/tours/``, updating the store's index only once.
+
+    Parameters
+    ==========
+    tours : list of dict
+        komoot tour items including their coordinates that are
+        added to the store or replace stored tours of the same ``id``.
+    deleted_ids : list of int or str
+        ``id`` s of tours that are removed from the store.
+    directory : pathlib.Path, default = None
+        The store directory. Defaults to ``~/.komoog/tours/``.
+
+    Returns
+    =======
+    entries : list of dict
+        The index entries of the written tours.
+    """
+
+    if directory is None:
+        directory = tour_dir
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    index = { str(entry['id']): entry for entry in _read_index(directory) }
+
+    entries = [ _write_shard(tour, directory) for tour in tours ]
+    for entry in entries:
+        index[str(entry['id'])] = entry
+
+    for tour_id in deleted_ids:
+        index.pop(str(tour_id), None)
+
+    _write_json_atomic(directory / "index.json", list(index.values()))
+
+    for tour_id in deleted_ids:
+        _remove_shard(tour_id, directory)
+
+    return entries
+
+def _remove_shard(tour_id, directory):
+
+    for suffix in ('.json', '.npy'):
+        fn = directory / (str(tour_id) + suffix)
+        if fn.exists():
+            fn.unlink()
+
+def _write_shard(tour, directory):
+    """Write a tour's metadata and coordinates, return its index entry."""
+
+    directory.mkdir(parents=True, exist_ok=True)
+
+    tour = dict(tour)
+    coordinates = _convert_coordinates_to_array(tour.pop('coordinates', []))
+    tour_id = str(tour['id'])
+
+    tmp = directory / (tour_id + '.tmp.npy')
+    np.save(tmp, coordinates)
+    os.replace(tmp, directory / (tour_id + '.npy'))
+    _write_json_atomic(directory / (tour_id + '.json'), tour)
+
+    return _get_index_entry(tour, coordinates)
+
+def _read_index(directory):
+
+    fn = Path(directory) / "index.json"
+    if not fn.exists():
+        return []
+
+    with open(fn,'r') as f:
+        index = json.load(f)
+
+    return index
+
+def read_tour_index(directory=None):
+    """
+    Read the index of the tour store in ``~/.komoog/tours/``.
+    Each entry contains a tour's ``id``, ``name``, ``distance``,
+    elevation statistics, and the number of points, but not
+    its coordinates.
+    """
+
+    if directory is None:
+        directory = tour_dir
+
+    if not (Path(directory) / "index.json").exists():
+        if directory == tour_dir and tour_file.exists():
+            return [ _get_index_entry(tour, _convert_coordinates_to_array(tour['coordinates']))
+                     for tour in _read_legacy_tours() ]
         raise FileNotFoundError("Couldn't find any downloaded tours. Please call komoog.komoot.download_all_komoot_tours() first.")
 
+    return _read_index(directory)
+
+def read_tour(tour_id, directory=None, coordinates_as_array=False, mmap_mode='r'):
+    """
+    Read a single tour from the tour store in ``~/.komoog/tours/``.
+    Only this tour's files are read.
+
+    Parameters
+    ==========
+    tour_id : int or str
+        The tour's ``id``.
+    directory : pathlib.Path, default = None
+        The store directory. Defaults to ``~/.komoog/tours/``.
+    coordinates_as_array : bool, default = False
+        If ``True``, the tour's coordinates are returned as a
+        structured array with float64 fields ``'lat'``, ``'lng'``,
+        ``'alt'``, and, if the points have timestamps, ``'t'``
+        instead of a list of dicts. Such
+        tours can be passed to the conversion functions in
+        :mod:`komoog.gpx` and :mod:`komoog.audio` without copies.
+    mmap_mode : str, default = 'r'
+        Passed to :func:`numpy.load` if ``coordinates_as_array``
+        is ``True``. With ``'r'``, coordinates are memory-mapped
+        read-only, such that processes reading the same tour share
+        the operating system's page cache. Use ``None`` to load
+        the coordinates into memory.
+
+    Returns
+    =======
+    tour : dict
+        The komoot tour item including its coordinates.
+    """
+
+    if directory is None:
+        directory = tour_dir
+    directory = Path(directory)
+
+    tour_id = str(tour_id)
+
+    if not (directory / (tour_id + '.json')).exists() and directory == tour_dir and tour_file.exists():
+        for tour in _read_legacy_tours():
+            if str(tour['id']) == tour_id:
+                if coordinates_as_array:
+                    tour['coordinates'] = _convert_coordinates_to_array(tour['coordinates'])
+                return tour
+
+    with open(directory / (tour_id + '.json'),'r') as f:
+        tour = json.load(f)
+
+    if coordinates_as_array:
+        tour['coordinates'] = np.load(directory / (tour_id + '.npy'), mmap_mode=mmap_mode)
+    else:
+        coordinates = np.load(directory / (tour_id + '.npy'))
+        tour['coordinates'] = _convert_array_to_coordinates(coordinates)
+
+    return tour
+
+def delete_tour(tour_id, directory=None):
+    """Remove a tour from the tour store in ``~/.komoog/tours/``."""
+
+    update_tours(deleted_ids=[tour_id], directory=directory)
+
+def _read_legacy_tours():
+
     with open(tour_file,'r') as f:
         tours = json.load(f)
 
     return tours
 
-def write_tours(tours):
-    """Write downloaded tours to ``~/.komoog/tours.json``"""
+def iter_tours(directory=None, coordinates_as_array=False, mmap_mode='r'):
+    """
+    Iterate over the downloaded tours in the tour store in
+    ``~/.komoog/tours/``, reading every tour only when it is
+    consumed. See :func:`komoog.io.read_tour` for a description
+    of the parameters.
+
+    Every memory-mapped tour holds an open file descriptor until
+    it is garbage-collected, so iterating instead of collecting
+    all tours in a list keeps the number of open files bounded.
+    """
+
+    for entry in read_tour_index(directory):
+        yield read_tour(entry['id'], directory, coordinates_as_array, mmap_mode)
+
+def read_tours(directory=None, coordinates_as_array=False, mmap_mode='r'):
+    """
+    Read downloaded tours from the tour store in ``~/.komoog/tours/``.
+    Falls back to a monolithic ``~/.komoog/tours.json`` as written
+    by earlier versions. See :func:`komoog.io.read_tour` for
+    a description of the parameters.
+
+    Every memory-mapped tour holds an open file descriptor, so to
+    map many tours, iterate with :func:`komoog.io.iter_tours` instead.
+    """
+
+    if directory is None:
+        directory = tour_dir
+
+    if not (Path(directory) / "index.json").exists():
+        if directory == tour_dir and tour_file.exists():
+            tours = _read_legacy_tours()
+            if coordinates_as_array:
+                for tour in tours:
+                    tour['coordinates'] = _convert_coordinates_to_array(tour['coordinates'])
+            return tours
+        raise FileNotFoundError("Couldn't find any downloaded tours. Please call komoog.komoot.download_all_komoot_tours() first.")
+
+    return list(iter_tours(directory, coordinates_as_array, mmap_mode))
 
-    with open(tour_file,'w') as f:
-        json.dump(tours,f)
+def write_tours(tours, directory=None):
+    """
+    Write downloaded tours to the tour store in ``~/.komoog/tours/``,
+    replacing the tours that are currently stored.
+    """
+
+    if directory is None:
+        directory = tour_dir
+    directory = Path(directory)
+
+    directory.mkdir(parents=True, exist_ok=True)
+
+    index = [ _write_shard(tour, directory) for tour in tours ]
+
+    stale = { str(entry['id']) for entry in _read_index(directory) } - \
+            { str(entry['id']) for entry in index }
+
+    _write_json_atomic(directory / "index.json", index)
+
+    for tour_id in stale:
+        _remove_shard(tour_id, directory)
 
 
 def write_wav(fn,audio_data,sampling_rate):
@@ -35,8 +344,204 @@ def write_wav(fn,audio_data,sampling_rate):
     Write audio data to a wav file.
     """
 
+    from scipy.io import wavfile
+
     wavfile.write(fn,sampling_rate,audio_data)
 
+class WavWriter():
+    """
+    Write 16-bit PCM audio data to a wav file chunk by chunk,
+    such that only a single chunk has to be held in memory.
+    The RIFF header is written on opening and its size fields
+    are patched on closing. The result is identical to the file
+    written by :func:`komoog.io.write_wav` for the concatenated
+    chunks.
+
+    .. code:: python
+
+        with WavWriter('tour.wav', 44100) as writer:
+            for chunk in iter_tour_audio(tour, length_in_samples=44100*3600):
+                writer.write(chunk)
+
+    Parameters
+    ==========
+    fn : str or pathlib.Path
+        Path to the wav file.
+    sampling_rate : int
+        Sampling rate in Hz.
+    num_channels : int, default = 1
+        Number of channels. Multi-channel chunks have
+        shape ``(samples, num_channels)``.
+
+    Attributes
+    ==========
+    frames_written : int
+        Number of frames (samples per channel) written so far.
+    """
+
+    _HEADER_SIZE = 44
+    _MAX_DATA_SIZE = 0xFFFFFFFF - _HEADER_SIZE + 8
+
+    def __init__(self, fn, sampling_rate, num_channels=1):
+
+        self.fn = fn
+        self.sampling_rate = int(sampling_rate)
+        self.num_channels = int(num_channels)
+        self.frames_written = 0
+        self._data_size = 0
+        self._file = open(fn, 'wb')
+        self._file.write(self._header())
+
+    def _header(self):
+
+        block_align = 2 * self.num_channels
+
+        return b''.join([
+                    b'RIFF',
+                    (self._HEADER_SIZE - 8 + self._data_size).to_bytes(4, 'little'),
+                    b'WAVE',
+                    b'fmt ',
+                    (16).to_bytes(4, 'little'),
+                    (1).to_bytes(2, 'little'), # PCM
+                    self.num_channels.to_bytes(2, 'little'),
+                    self.sampling_rate.to_bytes(4, 'little'),
+                    (self.sampling_rate * block_align).to_bytes(4, 'little'),
+                    block_align.to_bytes(2, 'little'),
+                    (16).to_bytes(2, 'little'),
+                    b'data',
+                    self._data_size.to_bytes(4, 'little'),
+                ])
+
+    def write(self, chunk):
+        """Append a chunk of 16-bit audio data."""
+
+        chunk = np.ascontiguousarray(chunk, dtype='<i2')
+
+        if self._data_size + chunk.nbytes > self._MAX_DATA_SIZE:
+            raise ValueError("Wav files are limited to 4 GiB of audio data")
+
+        self._file.write(chunk.data)
+        self._data_size += chunk.nbytes
+        self.frames_written += chunk.nbytes // (2 * self.num_channels)
+
+    def close(self):
+        """Patch the header and close the file."""
+
+        if self._file is None:
+            return
+
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class FlacWriter():
+    """
+    Write 16-bit audio data to a losslessly compressed flac file
+    chunk by chunk. Requires the optional dependency ``soundfile``
+    (``pip install komoog[flac]``).
+
+    Parameters
+    ==========
+    fn : str or pathlib.Path
+        Path to the flac file.
+    sampling_rate : int
+        Sampling rate in Hz.
+    num_channels : int, default = 1
+        Number of channels. Multi-channel chunks have
+        shape ``(samples, num_channels)``.
+
+    Attributes
+    ==========
+    frames_written : int
+        Number of frames (samples per channel) written so far.
+    """
+
+    def __init__(self, fn, sampling_rate, num_channels=1):
+
+        try:
+            import soundfile
+        except ImportError as e:
+            raise ImportError("Writing flac files requires soundfile. "
+                              "Install it with `pip install komoog[flac]`.") from e
+
+        self.fn = fn
+        self.sampling_rate = int(sampling_rate)
+        self.num_channels = int(num_channels)
+        self.frames_written = 0
+        self._file = soundfile.SoundFile(str(fn),
+                                         mode='w',
+                                         samplerate=self.sampling_rate,
+                                         channels=self.num_channels,
+                                         format='FLAC',
+                                         subtype='PCM_16',
+                                        )
+
+    def write(self, chunk):
+        """Append a chunk of 16-bit audio data."""
+
+        chunk = np.asarray(chunk, dtype=np.int16)
+        self._file.write(chunk)
+        self.frames_written += len(chunk)
+
+    def close(self):
+        """Close the file."""
+
+        if self._file is None:
+            return
+
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+_AUDIO_WRITERS = {
+            'wav': WavWriter,
+            'flac': FlacWriter,
+        }
+
+def open_audio_writer(fn, sampling_rate, num_channels=1, format=None):
+    """
+    Open a streaming writer for an audio file.
+
+    Parameters
+    ==========
+    fn : str or pathlib.Path
+        Path to the audio file.
+    sampling_rate : int
+        Sampling rate in Hz.
+    num_channels : int, default = 1
+        Number of channels.
+    format : str, default = None
+        Either ``'wav'`` or ``'flac'``. If ``None``, the format
+        is inferred from the file extension of ``fn``.
+
+    Returns
+    =======
+    writer : WavWriter or FlacWriter
+        An open writer with methods ``write(chunk)`` and ``close()``.
+    """
+
+    if format is None:
+        format = Path(fn).suffix.lstrip('.').lower()
+
+    try:
+        writer = _AUDIO_WRITERS[format]
+    except KeyError:
+        raise ValueError(f"Unknown audio format '{format}'. Has to be any of {sorted(_AUDIO_WRITERS.keys())}")
+
+    return writer(fn, sampling_rate, num_channels)
+
 def read_gpx(fn):
     """
     Read a gpx file. Returns a `gpxpy.GPX` object.
@@ -51,7 +556,118 @@ def read_gpx(fn):
     to retrieve distance and elevation profile.
     """
 
+    import gpxpy
+
     with open(fn,'r') as gpx_file:
         gpx = gpxpy.parse(gpx_file)
 
     return gpx
+
+def _parse_gpx_time(text):
+    """Convert a GPX time string to a POSIX timestamp (naive times are UTC)."""
+
+    from gpxpy.gpxfield import parse_time
+
+    t = parse_time(text.strip())
+    if t is None:
+        return np.nan
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+
+    return t.timestamp()
+
+def iter_gpx_segments(fn, with_time=False):
+    """
+    Stream the track segments of a gpx file without building
+    a ``gpxpy.GPX`` object tree. Track points are parsed one by
+    one and appended to growable float buffers, so the memory
+    footprint is bounded by the output arrays.
+
+    Parameters
+    ==========
+    fn : str or pathlib.Path
+        Path to the gpx file.
+    with_time : bool, default = False
+        If ``True``, also parse the points' timestamps.
+
+    Yields
+    ======
+    segment : tuple of numpy.ndarray
+        ``(latitude, longitude, elevation)`` of a single non-empty
+        track segment, or ``(latitude, longitude, elevation, time)``
+        if ``with_time`` is ``True``. Missing elevations and times
+        are ``nan``, times are POSIX timestamps in seconds.
+    """
+
+    segment = None
+    in_point = False
+
+    for event, elem in iterparse(str(fn), events=('start', 'end')):
+
+        tag = elem.tag.rpartition('}')[2]
+
+        if event == 'start':
+            if in_point:
+                depth += 1
+            elif tag == 'trkseg':
+                segment = elem
+                columns = [ array('d') for _ in range(4 if with_time else 3) ]
+            elif tag == 'trkpt' and segment is not None:
+                in_point = True
+                depth = 0
+                # namespace of the point, which its own children share
+                ele_tag = elem.tag[:-len(tag)] + 'ele'
+                time_tag = elem.tag[:-len(tag)] + 'time'
+                point_ele = np.nan
+                point_time = np.nan
+            continue
+
+        if in_point:
+            if depth > 0:
+                # only direct children, not e.g. elements in <extensions>
+                if depth == 1 and elem.text:
+                    if elem.tag == ele_tag:
+                        point_ele = float(elem.text)
+                    elif elem.tag == time_tag and with_time:
+                        point_time = _parse_gpx_time(elem.text)
+                depth -= 1
+            elif tag == 'trkpt':
+                columns[0].append(float(elem.get('lat')))
+                columns[1].append(float(elem.get('lon')))
+                columns[2].append(point_ele)
+                if with_time:
+                    columns[3].append(point_time)
+                in_point = False
+                elem.clear()
+                # drop processed points from the tree
+                if len(segment) >= 1024:
+                    del segment[:]
+        elif tag == 'trkseg':
+            segment = None
+            elem.clear()
+            if len(columns[0]) > 0:
+                yield tuple(np.frombuffer(column, dtype=float) for column in columns)
+            columns = None
+
+def read_gpx_arrays(fn, with_time=False):
+    """
+    Read the track segments of a gpx file as arrays,
+    using the streaming parser :func:`komoog.io.iter_gpx_segments`.
+    Pass to :func:`komoog.gpx.convert_segments_to_arrays` as
+
+    .. code:: python
+
+        segments = read_gpx_arrays('Tour.gpx')
+        convert_segments_to_arrays(segments)
+
+    to retrieve distance and elevation profile.
+
+    Returns
+    =======
+    segments : list of tuple of numpy.ndarray
+        ``(latitude, longitude, elevation)`` per track segment, or
+        ``(latitude, longitude, elevation, time)`` if ``with_time``
+        is ``True``.
+    """
+
+    return list(iter_gpx_segments(fn, with_time=with_time))
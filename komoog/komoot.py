@@ -7,27 +7,271 @@ Adapted from https://github.com/js-on/medium_komoot.
 
 import requests
 import json
+import os
+import hashlib
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from komoog.paths import get_credentials, customdir
-from komoog.io import write_tours, read_tours
+from komoog.io import write_tours, read_tour_index, read_tour, update_tours, tour_dir
 
 import simplejson as json
 
-def get_tours_and_session():
+_LOGIN_URL = "https://account.komoot.com/v1/signin"
+_TRANSFER_URL = "https://account.komoot.com/actions/transfer?type=signin"
+_TOURS_URL = "https://www.komoot.de/user/{client_id}/tours"
+
+def configure_session(session,
+                      max_connections=10,
+                      retries=3,
+                      backoff_factor=0.5,
+                      ):
+    """
+    Mount an HTTP adapter with a connection pool and retries
+    on a ``requests.Session``.
+
+    Parameters
+    ==========
+    session : requests.Session
+        The session to configure.
+    max_connections : int, default = 10
+        Maximum number of connections kept open per host. Should
+        be at least the number of threads that share the session.
+    retries : int, default = 3
+        Number of retries for failed connections and responses
+        with status 429, 500, 502, 503, or 504.
+    backoff_factor : float, default = 0.5
+        Retry ``i`` waits ``backoff_factor * 2**(i-1)`` seconds.
+
+    Returns
+    =======
+    session : requests.Session
+        The configured session.
+    """
+
+    retry = Retry(total=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                 )
+    adapter = HTTPAdapter(pool_connections=max_connections,
+                          pool_maxsize=max_connections,
+                          max_retries=retry,
+                         )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+class HTTPCache():
+    """
+    A persistent cache for komoot responses and login cookies.
+
+    For every cached URL, the response body is stored together with
+    its ``ETag`` and ``Last-Modified`` headers. Subsequent requests
+    are sent as conditional requests, such that unchanged resources
+    are answered by the server with ``304 Not Modified`` and served
+    from disk. Login cookies are persisted as well, such that
+    :func:`komoog.komoot.get_tours_and_session` can reuse a still-valid
+    session instead of logging in again.
+
+    Parameters
+    ==========
+    directory : str or pathlib.Path, default = None
+        Where responses and cookies are stored. Defaults to
+        ``~/.komoog/http_cache/``.
+
+    Attributes
+    ==========
+    not_modified : int
+        Number of requests that were answered with ``304 Not Modified``.
+    misses : int
+        Number of requests that returned a full response.
+    """
+
+    def __init__(self, directory=None):
+
+        if directory is None:
+            directory = customdir / "http_cache"
+        self.directory = Path(directory)
+        self.not_modified = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+
+        key = hashlib.sha1(url.encode()).hexdigest()
+
+        return self.directory / (key + '.json'), self.directory / (key + '.body')
+
+    def get(self, session, url, headers=None, timeout=None):
+        """
+        Send a conditional GET request for ``url`` with ``session``.
+        Returns a ``requests.Response``. If the resource was not modified,
+        its ``status_code`` is 200, its content is the cached body,
+        and its attribute ``from_cache`` is ``True``.
+        """
+
+        headers = dict(headers or {})
+        meta_file, body_file = self._paths(url)
+
+        meta = None
+        if meta_file.exists() and body_file.exists():
+            with open(meta_file,'r') as f:
+                meta = json.load(f)
+            if meta.get('etag') is not None:
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified') is not None:
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and meta is not None:
+            with open(body_file,'rb') as f:
+                response._content = f.read()
+            response.status_code = 200
+            response.encoding = meta.get('encoding')
+            response.from_cache = True
+            with self._lock:
+                self.not_modified += 1
+            return response
+
+        response.from_cache = False
+        with self._lock:
+            self.misses += 1
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag is not None or last_modified is not None):
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = body_file.with_name(f'{body_file.name}.{threading.get_ident()}.tmp')
+            with open(tmp,'wb') as f:
+                f.write(response.content)
+            os.replace(tmp, body_file)
+            tmp = meta_file.with_name(f'{meta_file.name}.{threading.get_ident()}.tmp')
+            with open(tmp,'w') as f:
+                json.dump({
+                            'url': url,
+                            'etag': etag,
+                            'last_modified': last_modified,
+                            'encoding': response.encoding,
+                          },f)
+            os.replace(tmp, meta_file)
+
+        return response
+
+    def save_cookies(self, session):
+        """Persist the cookies of ``session``."""
+
+        cookies = [ {
+                        'name': cookie.name,
+                        'value': cookie.value,
+                        'domain': cookie.domain,
+                        'path': cookie.path,
+                        'expires': cookie.expires,
+                        'secure': cookie.secure,
+                    } for cookie in session.cookies ]
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fn = self.directory / "cookies.json"
+        tmp = fn.with_name('cookies.json.tmp')
+        with open(tmp,'w') as f:
+            json.dump(cookies,f)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, fn)
+
+    def load_cookies(self, session):
+        """
+        Add persisted cookies to ``session``. Returns ``False``
+        if no cookies were persisted.
+        """
+
+        fn = self.directory / "cookies.json"
+        if not fn.exists():
+            return False
+
+        with open(fn,'r') as f:
+            cookies = json.load(f)
+
+        for cookie in cookies:
+            session.cookies.set_cookie(requests.cookies.create_cookie(**cookie))
+
+        return len(cookies) > 0
+
+    def clear_cookies(self):
+        """Remove persisted cookies."""
+
+        fn = self.directory / "cookies.json"
+        if fn.exists():
+            fn.unlink()
+
+def _get(session, url, headers=None, timeout=None, cache=None):
+
+    if cache is None:
+        return session.get(url, headers=headers, timeout=timeout)
+    else:
+        return cache.get(session, url, headers=headers, timeout=timeout)
+
+def _request_tours(session, client_id, timeout=None, cache=None):
+
+    headers = {"onlyprops": "true"}
+
+    return _get(session, _TOURS_URL.format(client_id=client_id), headers=headers, timeout=timeout, cache=cache)
+
+def get_tours(session, client_id, timeout=None, cache=None):
+    """
+    Returns a list of the user's tours on komoot (without
+    coordinates), given a logged-in ``requests.Session``.
+    If an :class:`komoog.komoot.HTTPCache` is given, the
+    listing is requested conditionally.
+    """
+
+    response = _request_tours(session, client_id, timeout=timeout, cache=cache)
+    if response.status_code != 200:
+        print("Something went wrong in the request...")
+        print(response.text)
+        exit(1)
+
+    return _parse_tours(response)
+
+def _parse_tours(response):
+
+    data = response.json()
+
+    tours = data["user"]["_embedded"]["tours"]["_embedded"]["items"]
+
+    return tours
+
+def get_tours_and_session(timeout=None, session=None, cache=None):
     """
     Returns a list of the user's tours on komoot and
-    a ``requests.Session`` object.
+    a ``requests.Session`` object. If ``session`` is
+    given, it is used to login instead of a new one.
+
+    If an :class:`komoog.komoot.HTTPCache` is given, persisted
+    login cookies are tried first and the login is only repeated
+    if they are not valid anymore. The tour listing is requested
+    conditionally.
     """
 
     cred = get_credentials()
     email = cred['email']
     password = cred['password']
     client_id = cred['clientid']
-    login_url = "https://account.komoot.com/v1/signin"
-    tour_url = f"https://www.komoot.de/user/{client_id}/tours"
 
-    session = requests.Session()
+    if session is None:
+        session = requests.Session()
 
-    res = requests.get(login_url)
+    if cache is not None and cache.load_cookies(session):
+        response = _request_tours(session, client_id, timeout=timeout, cache=cache)
+        if response.status_code == 200:
+            return _parse_tours(response), session
+        session.cookies.clear()
+        cache.clear_cookies()
+
+    res = requests.get(_LOGIN_URL, timeout=timeout)
     cookies = res.cookies.get_dict()
 
     headers = {
@@ -40,62 +284,271 @@ def get_tours_and_session():
         "reason": "null"
     })
 
-    session.post(login_url,
+    session.post(_LOGIN_URL,
            headers=headers,
            data=payload,
            cookies=cookies,
+           timeout=timeout,
            )
 
-    url = "https://account.komoot.com/actions/transfer?type=signin"
-    session.get(url)
+    session.get(_TRANSFER_URL, timeout=timeout)
 
-    headers = {"onlyprops": "true"}
+    tours = get_tours(session, client_id, timeout=timeout, cache=cache)
 
-    response = session.get(tour_url, headers=headers)
-    if response.status_code != 200:
-        print("Something went wrong in the request...")
-        print(response.text)
-        exit(1)
-
-    data = response.json()
-
-    tours = data["user"]["_embedded"]["tours"]["_embedded"]["items"]
+    if cache is not None:
+        cache.save_cookies(session)
 
     return tours, session
 
-def get_tour(tours,tour_id,session):
+def get_tour(tours,tour_id,session,timeout=None,cache=None):
     """
     Returns a tour including coordinates given a
     `tour_id` (position of the tour in `tours`).
+    If an :class:`komoog.komoot.HTTPCache` is given, the
+    coordinates are requested conditionally.
     """
 
     tour = tours[tour_id]
     tour_url = tour["_links"]["coordinates"]["href"]
     headers = {"onlyprops": "true"}
-    response = session.get(tour_url, headers=headers)
+    response = _get(session, tour_url, headers=headers, timeout=timeout, cache=cache)
+    response.raise_for_status()
     tour_data = json.loads(response.text)
 
     tour['coordinates'] = tour_data['items']
 
     return tour
 
-def download_all_komoot_tours():
+def download_komoot_tours(tours,
+                          session,
+                          max_workers=4,
+                          timeout=30,
+                          retries=3,
+                          backoff_factor=0.5,
+                          cache=None,
+                          ):
+    """
+    Download the coordinates of many tours concurrently.
+
+    Parameters
+    ==========
+    tours : list of dict
+        Tours as returned by :func:`komoog.komoot.get_tours_and_session`.
+    session : requests.Session
+        A logged-in session. Is configured with
+        :func:`komoog.komoot.configure_session`.
+    max_workers : int, default = 4
+        Maximum number of concurrent requests.
+    timeout : float, default = 30
+        Timeout per request in seconds.
+    retries : int, default = 3
+        Number of retries per request.
+    backoff_factor : float, default = 0.5
+        Retry ``i`` waits ``backoff_factor * 2**(i-1)`` seconds.
+    cache : komoog.komoot.HTTPCache, default = None
+        If given, coordinates are requested conditionally and
+        unchanged ones are read from the cache.
+
+    Returns
+    =======
+    tours : list of dict
+        The tours including their coordinates, in the order of
+        the input.
+    """
+
+    configure_session(session,
+                      max_connections=max_workers,
+                      retries=retries,
+                      backoff_factor=backoff_factor,
+                     )
+
+    def _get_tour(i):
+        return get_tour(tours, i, session, timeout=timeout, cache=cache)
+
+    if max_workers <= 1:
+        return [ _get_tour(i) for i in range(len(tours)) ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tours = list(executor.map(_get_tour, range(len(tours))))
+
+    return tours
+
+def download_all_komoot_tours(max_workers=4,
+                              timeout=30,
+                              retries=3,
+                              backoff_factor=0.5,
+                              cache=None,
+                              ):
     """
     Login with user credentials, download tour information
     and all tours. Tours will be saved in a custom directory.
     Tours can be passed to :func:`komoog.gpx.convert_tour_to_gpx_tracks`
     afterwards.
+
+    Tours are downloaded concurrently, see
+    :func:`komoog.komoot.download_komoot_tours` for
+    a description of the parameters.
     """
 
-    tours, session = get_tours_and_session()
+    tours, session = get_tours_and_session(timeout=timeout, cache=cache)
 
-    tours = [ get_tour(tours, i, session) for i in range(len(tours)) ]
+    tours = download_komoot_tours(tours,
+                                  session,
+                                  max_workers=max_workers,
+                                  timeout=timeout,
+                                  retries=retries,
+                                  backoff_factor=backoff_factor,
+                                  cache=cache,
+                                 )
 
     write_tours(tours)
 
     return tours
 
 
+@contextmanager
+def _count_received_bytes(session):
+    """
+    Temporarily install a response hook on ``session`` that records
+    the number of body bytes received for every response in the
+    yielded list, i.e. before compressed bodies are decoded.
+    """
+
+    sizes = []
+
+    def hook(response, *args, **kwargs):
+        # reading the content consumes the raw stream, whose position
+        # is the number of bytes that were received
+        content = response.content
+        tell = getattr(response.raw, 'tell', None)
+        if tell is not None:
+            sizes.append(tell())
+        elif 'Content-Length' in response.headers:
+            sizes.append(int(response.headers['Content-Length']))
+        else:
+            sizes.append(len(content))
+
+    session.hooks['response'].append(hook)
+    try:
+        yield sizes
+    finally:
+        session.hooks['response'].remove(hook)
+
+def sync_tours(tours,
+               session,
+               directory=None,
+               max_workers=4,
+               timeout=30,
+               retries=3,
+               backoff_factor=0.5,
+               cache=None,
+               ):
+    """
+    Synchronize the local tour store with a tour listing.
+    Coordinates are only downloaded for tours that are new or
+    whose ``changed_at`` value differs from the stored one.
+    Stored tours that are missing in the listing are removed.
+
+    Parameters
+    ==========
+    tours : list of dict
+        Tours as returned by :func:`komoog.komoot.get_tours_and_session`.
+    session : requests.Session
+        A logged-in session.
+    directory : pathlib.Path, default = None
+        The store directory. Defaults to ``~/.komoog/tours/``.
+
+    See :func:`komoog.komoot.download_komoot_tours` for
+    a description of the remaining parameters.
+
+    Returns
+    =======
+    report : dict
+        Contains the number of ``'added'``, ``'modified'``,
+        ``'deleted'``, and ``'unchanged'`` tours as well
+        as the number of ``'bytes_transferred'`` for coordinates,
+        i.e. the size of the response bodies as received, which
+        may have been compressed.
+    """
+
+    if directory is None:
+        directory = tour_dir
+
+    if (Path(directory) / "index.json").exists():
+        index = { str(entry['id']): entry for entry in read_tour_index(directory) }
+    else:
+        index = {}
+
+    listed_ids = { str(tour['id']) for tour in tours }
+
+    added = []
+    modified = []
+    for tour in tours:
+        entry = index.get(str(tour['id']))
+        if entry is None:
+            added.append(tour)
+        elif tour.get('changed_at') is None or tour.get('changed_at') != entry.get('changed_at'):
+            modified.append(tour)
+
+    deleted_ids = [ tour_id for tour_id in index if tour_id not in listed_ids ]
+
+    with _count_received_bytes(session) as sizes:
+        downloaded = download_komoot_tours(added + modified,
+                                           session,
+                                           max_workers=max_workers,
+                                           timeout=timeout,
+                                           retries=retries,
+                                           backoff_factor=backoff_factor,
+                                           cache=cache,
+                                          )
+
+    update_tours(downloaded, deleted_ids=deleted_ids, directory=directory)
+
+    report = {
+                'added': len(added),
+                'modified': len(modified),
+                'deleted': len(deleted_ids),
+                'unchanged': len(tours) - len(added) - len(modified),
+                'bytes_transferred': sum(sizes),
+             }
+
+    return report
+
+def sync_komoot_tours(max_workers=4,
+                      timeout=30,
+                      retries=3,
+                      backoff_factor=0.5,
+                      cache=None,
+                      ):
+    """
+    Login with user credentials, download the tour listing, and
+    only download tours that were added or changed since the last
+    synchronization. Tours that were deleted on komoot are removed
+    from the local tour store.
+
+    See :func:`komoog.komoot.sync_tours` for a description of
+    the parameters and the returned report. Here,
+    ``'bytes_transferred'`` includes login and tour listing.
+    """
+
+    session = requests.Session()
+
+    with _count_received_bytes(session) as sizes:
+        tours, session = get_tours_and_session(timeout=timeout, session=session, cache=cache)
+
+        report = sync_tours(tours,
+                            session,
+                            max_workers=max_workers,
+                            timeout=timeout,
+                            retries=retries,
+                            backoff_factor=backoff_factor,
+                            cache=cache,
+                           )
+
+    report['bytes_transferred'] = sum(sizes)
+
+    return report
+
 def choose_komoot_tour_live():
     """
     Login with user credentials, download tour information,
@@ -123,15 +576,15 @@ def choose_downloaded_komoot_tour():
     afterwards.
     """
 
-    tours = read_tours()
+    index = read_tour_index()
 
-    for idx in range(len(tours)):
-        print(f"({idx+1}) {tours[idx]['name']}")
+    for idx in range(len(index)):
+        print(f"({idx+1}) {index[idx]['name']}")
 
     tour_id = int(input("Tour ID: "))
     tour_id -= 1
 
-    return tours[tour_id]
+    return read_tour(index[tour_id]['id'])
 
 
 if __name__=="__main__":
@@ -30,7 +30,7 @@ def plot_tour(tour,gradientphases=5,alpha=0.2,figsize=(4,1),max_elevation_differ
         The axis on which the signal was plotted
     """
 
-    dst, alt = gpx.convert_gpx_tracks_to_arrays(gpx.convert_tour_to_gpx_tracks(tour))
+    dst, alt = gpx.convert_tour_to_arrays(tour)
     x, y = audio.convert_distance_and_elevation_to_signal(dst, alt, max_elevation_difference=max_elevation_difference)
 
     return plot_signal(x,y,
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Sinks that consume streamed audio chunks and the registry
+of audio backends used by :func:`komoog.audio.play_audio`.
+"""
+
+import sys
+
+import numpy as np
+
+class AudioSink():
+    """
+    Base class for consumers of audio chunks as produced by
+    e.g. :func:`komoog.audio.iter_tour_audio`.
+
+    Subclasses implement :meth:`write` and may extend
+    :meth:`open` and :meth:`close`. Sinks can be used as context
+    managers after having been opened.
+    """
+
+    def __init__(self):
+        self.sampling_rate = None
+        self.num_channels = None
+        self.frames_written = 0
+
+    def open(self, sampling_rate, num_channels=1):
+        """Prepare the sink for audio of the given format."""
+
+        self.sampling_rate = sampling_rate
+        self.num_channels = num_channels
+        self.frames_written = 0
+
+        return self
+
+    def write(self, chunk):
+        """Consume a chunk of 16-bit audio data."""
+
+        raise NotImplementedError
+
+    def close(self):
+        """Finish consuming audio data."""
+
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class NullSink(AudioSink):
+    """
+    A sink that discards all audio data, but counts the
+    written frames in ``frames_written``.
+    """
+
+    def write(self, chunk):
+
+        self.frames_written += len(chunk)
+
+class AudioFileSink(AudioSink):
+    """
+    A sink that writes audio data to a file with a streaming
+    writer from :func:`komoog.io.open_audio_writer`.
+
+    Parameters
+    ==========
+    fn : str or pathlib.Path
+        Path to the audio file.
+    format : str, default = None
+        Either ``'wav'`` or ``'flac'``. If ``None``, the format
+        is inferred from the file extension of ``fn``.
+    """
+
+    format = None
+
+    def __init__(self, fn, format=None):
+
+        super().__init__()
+        self.fn = fn
+        if format is not None:
+            self.format = format
+        self._writer = None
+
+    def open(self, sampling_rate, num_channels=1):
+
+        from komoog.io import open_audio_writer
+
+        super().open(sampling_rate, num_channels)
+        self._writer = open_audio_writer(self.fn, sampling_rate, num_channels, format=self.format)
+
+        return self
+
+    def write(self, chunk):
+
+        self._writer.write(chunk)
+        self.frames_written = self._writer.frames_written
+
+    def close(self):
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+class WavFileSink(AudioFileSink):
+    """
+    A sink that writes audio data to a 16-bit PCM wav file.
+
+    Parameters
+    ==========
+    fn : str or pathlib.Path
+        Path to the wav file.
+    """
+
+    format = 'wav'
+
+    def __init__(self, fn):
+        super().__init__(fn)
+
+class FlacFileSink(AudioFileSink):
+    """
+    A sink that writes audio data to a 16-bit flac file.
+    Requires ``soundfile`` (``pip install komoog[flac]``).
+
+    Parameters
+    ==========
+    fn : str or pathlib.Path
+        Path to the flac file.
+    """
+
+    format = 'flac'
+
+    def __init__(self, fn):
+        super().__init__(fn)
+
+class PCMPipeSink(AudioSink):
+    """
+    A sink that writes raw little-endian 16-bit PCM data to a
+    binary stream, e.g. to pipe audio into another program as
+
+    .. code:: bash
+
+        python render.py | aplay -f S16_LE -r 44100 -c 1
+
+    Parameters
+    ==========
+    stream : file-like, default = None
+        A binary stream. Defaults to ``sys.stdout.buffer``.
+    """
+
+    def __init__(self, stream=None):
+
+        super().__init__()
+        self.stream = stream
+
+    def open(self, sampling_rate, num_channels=1):
+
+        super().open(sampling_rate, num_channels)
+        if self.stream is None:
+            self.stream = sys.stdout.buffer
+
+        return self
+
+    def write(self, chunk):
+
+        chunk = np.ascontiguousarray(chunk, dtype='<i2')
+        self.stream.write(chunk.tobytes())
+        self.frames_written += len(chunk)
+
+    def close(self):
+
+        if self.stream is not None:
+            self.stream.flush()
+
+class SimpleaudioSink(AudioSink):
+    """
+    A sink that plays audio data with ``simpleaudio``, which
+    is only imported when the sink is opened.
+
+    Because ``simpleaudio`` can only play whole buffers, chunks
+    are collected to blocks of ``block_duration`` seconds that are
+    played one after another. Short gaps between blocks may be
+    audible. Audio that is written in a single chunk is played
+    without gaps.
+
+    Parameters
+    ==========
+    block_duration : float, default = 1.
+        Duration of collected blocks in seconds.
+    """
+
+    def __init__(self, block_duration=1.):
+
+        super().__init__()
+        self.block_duration = block_duration
+        self._sa = None
+        self._blocks = []
+        self._buffered = 0
+        self._play_obj = None
+
+    def open(self, sampling_rate, num_channels=1):
+
+        try:
+            import simpleaudio
+        except ImportError as e:
+            raise ImportError("The 'simpleaudio' backend requires simpleaudio. "
+                              "Install it with `pip install komoog[playback]` "
+                              "or choose another backend.") from e
+
+        super().open(sampling_rate, num_channels)
+        self._sa = simpleaudio
+
+        return self
+
+    def write(self, chunk):
+
+        self._blocks.append(np.ascontiguousarray(chunk, dtype=np.int16))
+        self._buffered += len(chunk)
+        self.frames_written += len(chunk)
+
+        if self._buffered >= self.block_duration * self.sampling_rate:
+            self._play()
+
+    def _play(self):
+
+        if self._buffered == 0:
+            return
+
+        block = np.concatenate(self._blocks) if len(self._blocks) > 1 else self._blocks[0]
+        self._blocks = []
+        self._buffered = 0
+
+        if self._play_obj is not None:
+            self._play_obj.wait_done()
+        self._play_obj = self._sa.play_buffer(block, self.num_channels, 2, self.sampling_rate)
+
+    def close(self):
+
+        if self._sa is None:
+            return
+
+        self._play()
+        if self._play_obj is not None:
+            self._play_obj.wait_done()
+            self._play_obj = None
+
+_BACKENDS = {}
+
+def register_backend(name, factory):
+    """
+    Register an audio backend.
+
+    Parameters
+    ==========
+    name : str
+        The backend's name as used in :func:`komoog.audio.play_audio`.
+    factory : callable
+        Called with keyword arguments to create an unopened
+        :class:`komoog.sinks.AudioSink`, e.g. the sink class itself.
+    """
+
+    _BACKENDS[name] = factory
+
+def get_backend(name, **kwargs):
+    """
+    Create a sink of a registered audio backend.
+
+    Parameters
+    ==========
+    name : str
+        Any of the names returned by :func:`komoog.sinks.available_backends`.
+    **kwargs
+        Passed to the backend's factory, e.g. ``fn`` for the
+        ``'wav'`` backend.
+
+    Returns
+    =======
+    sink : AudioSink
+        An unopened sink.
+    """
+
+    try:
+        factory = _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown audio backend '{name}'. Has to be any of {available_backends()}")
+
+    return factory(**kwargs)
+
+def available_backends():
+    """Return the names of all registered audio backends."""
+
+    return sorted(_BACKENDS.keys())
+
+register_backend('simpleaudio', SimpleaudioSink)
+register_backend('wav', WavFileSink)
+register_backend('flac', FlacFileSink)
+register_backend('pcm', PCMPipeSink)
+register_backend('null', NullSink)
+
+def stream_audio(chunks, sink, sampling_rate, num_channels=1):
+    """
+    Feed audio chunks into a sink.
+
+    Parameters
+    ==========
+    chunks : iterable of numpy.ndarray of numpy.int16
+        Audio data, e.g. as yielded by :func:`komoog.audio.iter_tour_audio`.
+    sink : AudioSink
+        The sink consuming the chunks.
+    sampling_rate : int
+        The sampling rate of the audio data.
+    num_channels : int, default = 1
+        The number of interleaved channels of the audio data.
+
+    Returns
+    =======
+    frames_written : int
+        The number of frames that were consumed by the sink.
+    """
+
+    sink.open(sampling_rate, num_channels)
+    with sink:
+        for chunk in chunks:
+            sink.write(chunk)
+
+    return sink.frames_written
@@ -0,0 +1,26 @@
+"""
+Synthetic tours shared by the tests, built from a seeded random walk.
+"""
+
+import numpy as np
+
+def random_walk(n, seed=0):
+    """Return latitude, longitude, and elevation of a random walk of ``n`` points."""
+
+    rng = np.random.default_rng(seed)
+    lat = 47 + np.cumsum(rng.normal(0, 1e-4, size=n))
+    lng = 8 + np.cumsum(rng.normal(0, 1e-4, size=n))
+    alt = 500 + np.cumsum(rng.normal(0, 1, size=n))
+
+    return lat, lng, alt
+
+def synthetic_tour(n, seed=0):
+    """Return a komoot tour item with ``n`` coordinates and ``'id'`` ``1000+seed``."""
+
+    lat, lng, alt = random_walk(n, seed)
+
+    return {
+            'id': 1000 + seed,
+            'name': f'tour {seed}',
+            'coordinates': [ {'lat': a, 'lng': b, 'alt': c, 't': 0} for a, b, c in zip(lat.tolist(), lng.tolist(), alt.tolist()) ],
+           }
@@ -0,0 +1,438 @@
+import io
+import sys
+import unittest
+import tempfile
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from scipy.io import wavfile
+
+import komoog.audio
+from komoog.io import iter_tours, write_tours
+from komoog.instrument import Recorder
+from komoog.sinks import NullSink, WavFileSink, stream_audio, get_backend, available_backends
+from komoog.audio import (
+        WavetableCache,
+        convert_signal_to_audio,
+        tile_audio,
+        iter_signal_audio,
+        iter_tour_audio,
+        convert_tour_to_audio,
+        convert_distance_and_elevation_to_audio,
+        convert_distance_and_elevation_to_profile_audio,
+        convert_tours_to_audio,
+        convert_signals_to_audio,
+        convert_distance_and_elevation_to_signal,
+        get_tune,
+        play_audio,
+        mix_tours_to_audio,
+    )
+
+from komoog.tests._synthetic import synthetic_tour
+
+class AudioTest(unittest.TestCase):
+
+    def test_batch_conversion(self):
+
+        tours = [ synthetic_tour(300+50*i, seed=i) for i in range(5) ]
+        kwargs = dict(tune='A', approximate_length_in_seconds=0.1)
+        expected = { tour['id']: convert_tour_to_audio(tour, **kwargs)[0] for tour in tours }
+
+        results = list(convert_tours_to_audio(tours, max_workers=2, chunksize=2, **kwargs))
+        assert([ r[0] for r in results ] == [ tour['id'] for tour in tours ])
+        for tour_id, audio, sampling_rate in results:
+            assert(sampling_rate == 44100)
+            assert(np.array_equal(audio, expected[tour_id]))
+
+        results = list(convert_tours_to_audio(iter(tours), max_workers=2, ordered=False, **kwargs))
+        assert(sorted([ r[0] for r in results ]) == sorted(expected.keys()))
+
+        # memory-mapped tours from the tour store
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_tours(tours, tmpdir)
+            mapped_tours = iter_tours(tmpdir, coordinates_as_array=True)
+            for tour_id, audio, _ in convert_tours_to_audio(mapped_tours, max_workers=2, **kwargs):
+                assert(np.array_equal(audio, expected[tour_id]))
+            del mapped_tours
+
+    def test_signal_normalization(self):
+
+        rng = np.random.default_rng(7)
+        distance = np.cumsum(rng.random(10000))
+        distance -= distance[0]
+        elevation = 500 + np.cumsum(rng.normal(size=10000))
+
+        for max_elevation_difference in [0, 1e4]:
+            x, y = convert_distance_and_elevation_to_signal(distance, elevation, max_elevation_difference)
+
+            # the former implementation
+            mn, mx = min(elevation), max(elevation)
+            if mx - mn >= max_elevation_difference:
+                expected = (elevation - mn) / (mx - mn) * 2. - 1.
+            else:
+                mean = komoog.audio._trapezoid(elevation, distance) / distance[-1]
+                expected = (elevation - mean) / max_elevation_difference * 2.
+
+            assert(np.array_equal(x, distance / np.max(distance)))
+            assert(np.array_equal(y, expected))
+
+        unsorted = distance[::-1] + 1.
+        self.assertRaises(AssertionError, convert_distance_and_elevation_to_signal, unsorted, elevation)
+        convert_distance_and_elevation_to_signal(unsorted, elevation, validate=False)
+
+    def test_profile_audio_pitch(self):
+
+        # linearly rising profile, i.e. pitch rises from tune/2 to 2*tune
+        distance = np.linspace(0, 10000, 1001)
+        elevation = np.linspace(0, 1000, 1001)
+        sampling_rate = 44100
+        tune = 440
+
+        audio, _ = convert_distance_and_elevation_to_profile_audio(distance,
+                                                                   elevation,
+                                                                   tune=tune,
+                                                                   sampling_rate=sampling_rate,
+                                                                   approximate_length_in_seconds=2,
+                                                                  )
+
+        periods = int(np.ceil(sampling_rate*2/int(sampling_rate/tune)))
+        frequency = tune * 2**(2*np.arange(periods)/periods-1)
+        expected_length = np.sum((sampling_rate/frequency).astype(int))
+        assert(abs(len(audio)-expected_length) < 0.01 * expected_length)
+
+        # every period of the sawtooth-like waveform has one upward zero crossing
+        crossings = np.where((audio[:-1] < 0) & (audio[1:] >= 0))[0]
+        assert(abs(len(crossings)-periods) <= 2)
+
+        local_period = np.diff(crossings)
+        for i in [periods//4, periods//2, 3*periods//4]:
+            assert(abs(local_period[i] - sampling_rate/frequency[i]) <= 2)
+
+    def test_wavetable_cache(self):
+
+        x = np.linspace(0, 1, 200)
+        y = np.sin(2*np.pi*x)
+
+        original_cache = komoog.audio.wavetable_cache
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                cache = komoog.audio.wavetable_cache = WavetableCache(maxsize=1, directory=tmpdir)
+
+                audio, _ = convert_signal_to_audio(x, y, tune='A', approximate_length_in_seconds=0)
+                assert(cache.stats()['misses'] == 1)
+
+                cached_audio, _ = convert_signal_to_audio(x, y, tune='A', approximate_length_in_seconds=0)
+                assert(cache.hits == 1)
+                assert(np.array_equal(audio, cached_audio))
+
+                # evicts the first waveform from memory
+                convert_signal_to_audio(x, y, tune='C', approximate_length_in_seconds=0)
+                assert(len(cache) == 1)
+
+                cached_audio, _ = convert_signal_to_audio(x, y, tune='A', approximate_length_in_seconds=1)
+                assert(cache.disk_hits == 1)
+                assert(np.array_equal(audio, cached_audio[:len(audio)]))
+
+                # keys depend on the version of the rendering
+                key = cache.key(x, y, tune=440)
+                komoog.audio._WAVETABLE_CACHE_VERSION += 1
+                try:
+                    assert(cache.key(x, y, tune=440) != key)
+                finally:
+                    komoog.audio._WAVETABLE_CACHE_VERSION -= 1
+
+                # long signals are not cached
+                cache.clear()
+                long_x = np.linspace(0, 1, komoog.audio._MAX_CACHED_POINTS+1)
+                convert_signal_to_audio(long_x, np.sin(2*np.pi*long_x), approximate_length_in_seconds=0)
+                convert_signals_to_audio([(long_x, np.sin(2*np.pi*long_x)), (x, y)])
+                assert(cache.misses == 1 and len(cache) == 1)
+
+                komoog.audio.wavetable_cache = None
+                uncached_audio, _ = convert_signal_to_audio(x, y, tune='A', approximate_length_in_seconds=0)
+                assert(np.array_equal(audio, uncached_audio))
+        finally:
+            komoog.audio.wavetable_cache = original_cache
+
+    def test_resamplers(self):
+
+        rng = np.random.default_rng(4)
+        x = np.concatenate([[0.], np.sort(rng.random(2000)), [1.]])
+        y = np.sin(2*np.pi*x) + 0.1 * np.sin(20*np.pi*x)
+
+        original_cache = komoog.audio.wavetable_cache
+        komoog.audio.wavetable_cache = None
+        try:
+            reference, _ = convert_signal_to_audio(x, y, approximate_length_in_seconds=0, resampler='interp1d')
+            for resampler, tolerance in [('cubic', 1), ('keys', 4), ('linear', 16)]:
+                audio, _ = convert_signal_to_audio(x, y, approximate_length_in_seconds=0, resampler=resampler)
+                assert(len(audio) == len(reference))
+                assert(np.max(np.abs(audio.astype(int) - reference)) <= tolerance)
+        finally:
+            komoog.audio.wavetable_cache = original_cache
+
+        with self.assertRaises(ValueError):
+            convert_signal_to_audio(x, y, resampler='quintic')
+
+    def test_decimation(self):
+
+        # box filter averages reproduce linear signals
+        x = np.linspace(0, 1, 10001)**2
+        x_sample, y_sample = komoog.audio._decimate_signal(x, 3*x, 101)
+        assert(len(x_sample) == 101)
+        assert(np.allclose(y_sample[1:-1], 3*x_sample[1:-1]))
+        assert(y_sample[0] == y_sample[-1])
+
+        rng = np.random.default_rng(5)
+        x = np.concatenate([[0.], np.sort(rng.random(200000)), [1.]])
+        y = np.sin(2*np.pi*x) + 0.3 * np.sin(6*np.pi*x) + 0.01 * rng.normal(size=len(x))
+
+        original_cache = komoog.audio.wavetable_cache
+        original_points = komoog.audio._DECIMATION_POINTS_PER_SAMPLE
+        komoog.audio.wavetable_cache = None
+        try:
+            with Recorder() as recorder:
+                audio, _ = convert_signal_to_audio(x, y, approximate_length_in_seconds=0)
+            decimate = [ record for record in recorder.records if record['stage'] == 'audio.decimate' ]
+            assert(len(decimate) == 1)
+            assert(decimate[0]['samples'] == 16*len(audio)+1)
+
+            komoog.audio._DECIMATION_POINTS_PER_SAMPLE = len(x)
+            reference, _ = convert_signal_to_audio(x, y, approximate_length_in_seconds=0)
+        finally:
+            komoog.audio.wavetable_cache = original_cache
+            komoog.audio._DECIMATION_POINTS_PER_SAMPLE = original_points
+
+        assert(len(audio) == len(reference))
+        assert(np.max(np.abs(audio.astype(int) - reference)) < 0.01 * 32767)
+
+        # coinciding last points, i.e. a final interval of zero width
+        x_sample, y_sample = komoog.audio._decimate_signal(np.array([0., 0.5, 1., 1.]), np.array([0., 1., 0., 2.]), 11)
+        assert(np.all(np.isfinite(y_sample)))
+
+        distance = np.cumsum(rng.random(20000))
+        distance -= distance[0]
+        distance[-1] = distance[-2]
+        elevation = 500 + np.cumsum(rng.normal(size=20000))
+        audio, _ = convert_distance_and_elevation_to_audio(distance, elevation)
+        assert(len(audio) > 0)
+
+    def test_bandlimited_synthesis(self):
+
+        x = np.linspace(0, 1, 1000)
+        y = np.where(x < 0.5, -1., 1.) + 0.2 * np.sin(14*np.pi*x)
+
+        def spectrum(audio):
+            return np.abs(np.fft.rfft(audio.astype(float)))**2
+
+        sampling_rate = 44100
+        tune = 5000.
+        audio, _ = convert_signal_to_audio(x, y, tune=tune, sampling_rate=sampling_rate, synthesis='bandlimited')
+        assert(len(audio) == sampling_rate)
+
+        # one second long, i.e. bins have a width of 1 Hz
+        power = spectrum(audio)
+        frequencies = np.arange(len(power))
+        assert(np.argmax(power) == tune)
+        harmonic = np.abs(frequencies - tune * np.round(frequencies/tune)) <= 2
+        assert(power[~harmonic].sum() < 1e-6 * power.sum())
+
+        # the looped waveform is detuned and aliased
+        looped, _ = convert_signal_to_audio(x, y, tune=tune, sampling_rate=sampling_rate)
+        power = spectrum(looped[:sampling_rate])
+        assert(np.argmax(power) != tune)
+
+        audio, _ = convert_signal_to_audio(x, y, tune=tune, length_in_samples=10000, synthesis='bandlimited')
+        chunks = list(iter_signal_audio(x, y, tune=tune, length_in_samples=10000, chunk_size=999, synthesis='bandlimited'))
+        assert(np.array_equal(np.concatenate(chunks), audio))
+
+        with self.assertRaises(ValueError):
+            convert_signal_to_audio(x, y, synthesis='fm')
+
+    def test_batched_conversion(self):
+
+        rng = np.random.default_rng(6)
+        signals = []
+        for n in [50, 300, 1000, 5000, 20000]:
+            x = np.concatenate([[0.], np.sort(rng.random(n-2)), [1.]])
+            y = np.sin(2*np.pi*x) + 0.3 * np.sin(6*np.pi*x) + 0.01 * rng.normal(size=n)
+            signals.append((x, y))
+
+        original_cache = komoog.audio.wavetable_cache
+        komoog.audio.wavetable_cache = None
+        try:
+            for resampler in ['cubic', 'keys', 'linear']:
+                audio, _ = convert_signals_to_audio(signals, approximate_length_in_seconds=0, resampler=resampler)
+                for (x, y), row in zip(signals, audio):
+                    expected, _ = convert_signal_to_audio(x, y, approximate_length_in_seconds=0, resampler=resampler)
+                    assert(len(row) == len(expected))
+                    if len(x) > 2000:
+                        # pre-decimated to the same grid in both cases
+                        assert(np.array_equal(row, expected))
+                    else:
+                        assert(np.max(np.abs(row.astype(int) - expected)) < 0.05 * 32767)
+        finally:
+            komoog.audio.wavetable_cache = original_cache
+
+        cache = WavetableCache()
+        komoog.audio.wavetable_cache = cache
+        try:
+            audio, _ = convert_signals_to_audio(signals, length_in_samples=1000)
+            assert(audio.shape == (len(signals), 1000))
+            assert(cache.misses == len(signals))
+            cached, _ = convert_signals_to_audio(signals[::-1], length_in_samples=1000)
+            assert(cache.hits == len(signals))
+            assert(np.array_equal(cached, audio[::-1]))
+        finally:
+            komoog.audio.wavetable_cache = original_cache
+
+        audio, _ = convert_signals_to_audio(signals, approximate_length_in_seconds=1)
+        period = int(44100/get_tune('C'))
+        assert(audio.shape[1] == int(np.ceil(44100/period))*period)
+        assert(np.array_equal(audio[:,:period], audio[:,period:2*period]))
+
+    def test_exact_length(self):
+
+        loop = np.arange(7, dtype=np.int16)
+        assert(np.array_equal(tile_audio(loop, 17), np.concatenate([loop, loop, loop[:3]])))
+        assert(len(tile_audio(loop, 0)) == 0)
+
+        x = np.linspace(0, 1, 200)
+        y = np.sin(2*np.pi*x)
+        single, _ = convert_signal_to_audio(x, y, approximate_length_in_seconds=0)
+        audio, _ = convert_signal_to_audio(x, y, length_in_samples=44101)
+        assert(len(audio) == 44101)
+        assert(np.array_equal(audio[:len(single)], single))
+        assert(np.array_equal(audio[len(single):2*len(single)], single))
+
+        audio, _ = convert_distance_and_elevation_to_profile_audio(x*1000, y*100, length_in_samples=12345)
+        assert(len(audio) == 12345)
+
+        # the requested length does not change the pitch of a rising profile
+        distance = np.linspace(0, 10000, 1001)
+        elevation = np.linspace(0, 1000, 1001)
+        tune = 440
+        natural, _ = convert_distance_and_elevation_to_profile_audio(distance, elevation, tune=tune, approximate_length_in_seconds=2)
+        audio, _ = convert_distance_and_elevation_to_profile_audio(distance, elevation, tune=tune, length_in_samples=len(natural))
+        assert(np.array_equal(audio, natural))
+
+        for length_in_samples in [30000, 88200]:
+            audio, _ = convert_distance_and_elevation_to_profile_audio(distance,
+                                                                       elevation,
+                                                                       tune=tune,
+                                                                       length_in_samples=length_in_samples,
+                                                                      )
+            assert(len(audio) == length_in_samples)
+
+            crossings = np.where((audio[:-1] < 0) & (audio[1:] >= 0))[0]
+            periods = len(crossings)
+            local_period = np.diff(crossings)
+            for i in [periods//4, periods//2, 3*periods//4]:
+                assert(abs(local_period[i] - 44100/(tune*2**(2*i/periods-1))) <= 2)
+
+    def test_streaming(self):
+
+        x = np.linspace(0, 1, 200)
+        y = np.sin(2*np.pi*x)
+
+        expected, _ = convert_signal_to_audio(x, y, length_in_samples=10000)
+        chunks = list(iter_signal_audio(x, y, length_in_samples=10000, chunk_size=1024))
+        assert(all(len(chunk) == 1024 for chunk in chunks[:-1]))
+        assert(np.array_equal(np.concatenate(chunks), expected))
+
+        # endless stream
+        chunks = islice(iter_signal_audio(x, y, chunk_size=512), 1000)
+        assert(stream_audio(chunks, NullSink(), 44100) == 512000)
+
+        tour = synthetic_tour(300)
+        expected, _ = convert_tour_to_audio(tour, length_in_samples=5000)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = Path(tmpdir) / 'tour.wav'
+            stream_audio(iter_tour_audio(tour, length_in_samples=5000, chunk_size=300), WavFileSink(fn), 44100)
+            sampling_rate, audio = wavfile.read(fn)
+
+        assert(sampling_rate == 44100)
+        assert(np.array_equal(audio, expected))
+
+    def test_backends(self):
+
+        assert(set(available_backends()) >= {'simpleaudio', 'wav', 'pcm', 'null'})
+        self.assertRaises(ValueError, get_backend, 'gramophone')
+
+        # creating the simpleaudio sink must not import simpleaudio
+        get_backend('simpleaudio')
+        assert('simpleaudio' not in sys.modules)
+
+        audio, sampling_rate = convert_signal_to_audio(np.linspace(0, 1, 100), np.linspace(0, 1, 100), length_in_samples=4000)
+
+        play_audio(audio, sampling_rate, backend='null')
+
+        stream = io.BytesIO()
+        play_audio(audio, sampling_rate, backend='pcm', stream=stream)
+        assert(np.array_equal(np.frombuffer(stream.getvalue(), dtype='<i2'), audio))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = Path(tmpdir) / 'audio.wav'
+            play_audio(audio, sampling_rate, backend='wav', fn=fn)
+            _, written = wavfile.read(fn)
+
+        assert(np.array_equal(written, audio))
+
+    def test_mixer(self):
+
+        tours = [ synthetic_tour(400, seed=i) for i in range(3) ]
+        length = 10000
+
+        # as many tours as channels: every tour on its own channel
+        audio, _ = mix_tours_to_audio(tours, num_channels=3, tunes=['C', 'E', 440.], length_in_samples=length, block_size=999)
+        assert(audio.shape == (length, 3))
+        assert(audio.dtype == np.int16)
+        for channel, (tour, tune) in enumerate(zip(tours, ['C', 'E', 440.])):
+            expected, _ = convert_tour_to_audio(tour, tune=tune, length_in_samples=length)
+            assert(np.array_equal(audio[:,channel], expected))
+
+        # a centered tour has equal power on both stereo channels
+        audio, _ = mix_tours_to_audio(tours[:1], pans=0., gains=1., length_in_samples=length)
+        expected, _ = convert_tour_to_audio(tours[0], length_in_samples=length)
+        assert(np.array_equal(audio[:,0], audio[:,1]))
+        assert(np.max(np.abs(audio[:,0] - expected * np.sqrt(0.5))) <= 0.5)
+
+        # the default gains prevent clipping, explicit gains may clip
+        audio, _ = mix_tours_to_audio(tours, pans=[-1, -1, 1], approximate_length_in_seconds=0.5)
+        assert(len(audio) == 22050)
+        assert(np.max(np.abs(audio[:,0].astype(int))) <= 32767)
+        audio, _ = mix_tours_to_audio(tours, pans=[-1, -1, 1], gains=[1, 1, 0.5], length_in_samples=length)
+        assert(np.max(audio[:,0]) == 32767)
+        assert(np.max(np.abs(audio[:,1].astype(int))) <= 16384)
+
+        self.assertRaises(ValueError, mix_tours_to_audio, tours, gains=[1, 1])
+        self.assertRaises(ValueError, mix_tours_to_audio, [])
+
+        stream = io.BytesIO()
+        play_audio(audio, 44100, backend='pcm', stream=stream)
+        assert(np.array_equal(np.frombuffer(stream.getvalue(), dtype='<i2').reshape(-1, 2), audio))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = Path(tmpdir) / 'mix.wav'
+            play_audio(audio, 44100, backend='wav', fn=fn)
+            _, written = wavfile.read(fn)
+        assert(np.array_equal(written, audio))
+
+
+if __name__ == "__main__":
+
+    T = AudioTest()
+    T.test_batch_conversion()
+    T.test_signal_normalization()
+    T.test_profile_audio_pitch()
+    T.test_wavetable_cache()
+    T.test_resamplers()
+    T.test_decimation()
+    T.test_bandlimited_synthesis()
+    T.test_batched_conversion()
+    T.test_exact_length()
+    T.test_streaming()
+    T.test_backends()
+    T.test_mixer()
@@ -0,0 +1,135 @@
+import io
+import unittest
+import tempfile
+from pathlib import Path
+from contextlib import redirect_stdout, redirect_stderr
+
+import numpy as np
+import gpxpy.gpx
+
+from scipy.io import wavfile
+
+from komoog.cli import main, get_sources, render, read_manifest, MANIFEST_NAME
+from komoog.io import write_tours, write_tour, read_gpx_arrays
+from komoog.gpx import convert_segments_to_arrays
+from komoog.audio import convert_tour_to_audio, convert_distance_and_elevation_to_audio
+
+from komoog.tests._synthetic import synthetic_tour
+
+def _run(*argv):
+
+    with redirect_stdout(io.StringIO()) as stdout:
+        assert(main(list(argv)) == 0)
+
+    return stdout.getvalue()
+
+class CLITest(unittest.TestCase):
+
+    def test_render_store(self):
+
+        tours = [ synthetic_tour(300+100*i, seed=i) for i in range(4) ]
+        kwargs = dict(approximate_length_in_seconds=0.1, sampling_rate=8000)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = Path(tmpdir) / 'store'
+            out = Path(tmpdir) / 'out'
+            write_tours(tours, store)
+
+            args = ['render', '--store', str(store), '-o', str(out), '-j', '0', '-q',
+                    '--length', '0.1', '--sampling-rate', '8000']
+            summary = _run(*args)
+            assert('rendered 4 tours, skipped 0' in summary)
+
+            for tour in tours:
+                sampling_rate, audio = wavfile.read(out / f"{tour['id']}.wav")
+                expected, _ = convert_tour_to_audio(tour, **kwargs)
+                assert(sampling_rate == 8000)
+                assert(np.array_equal(audio, expected))
+
+            # everything is up to date
+            assert('rendered 0 tours, skipped 4' in _run(*args))
+
+            # a changed tour is rendered again
+            tours[1]['coordinates'] = tours[1]['coordinates'][:-10]
+            tours[1]['changed_at'] = '2021-09-01T00:00:00.000Z'
+            write_tour(tours[1], store)
+            assert('rendered 1 tours, skipped 3' in _run(*args))
+
+            # resume after an interrupted job that left a partial line
+            # and a missing output behind
+            (out / f"{tours[2]['id']}.wav").unlink()
+            with open(out / MANIFEST_NAME, 'a') as f:
+                f.write('{"output": "10')
+            assert('rendered 1 tours, skipped 3' in _run(*args))
+            assert(len(read_manifest(out)) == 4)
+            assert(len((out / MANIFEST_NAME).read_text().splitlines()) == 4)
+
+            # changed parameters, worker processes
+            summary = _run('render', '--store', str(store), '-o', str(out), '-j', '2', '-q',
+                           '--tune', 'A', '--tour-ids', '1000', '1003')
+            assert('rendered 2 tours, skipped 0' in summary)
+
+            assert('rendered 4 tours, skipped 0' in _run(*(args + ['--force'])))
+
+    def test_render_gpx(self):
+
+        tour = synthetic_tour(500)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+
+            # two segments with a gap in between
+            gpx = gpxpy.gpx.GPX()
+            track = gpxpy.gpx.GPXTrack()
+            for points in [tour['coordinates'][:200], tour['coordinates'][300:]]:
+                segment = gpxpy.gpx.GPXTrackSegment()
+                for point in points:
+                    segment.points.append(gpxpy.gpx.GPXTrackPoint(point['lat'], point['lng'], elevation=point['alt']))
+                track.segments.append(segment)
+            gpx.tracks.append(track)
+            fn = tmpdir / 'tour.gpx'
+            fn.write_text(gpx.to_xml())
+
+            sources = get_sources(gpx_files=[str(fn)])
+            assert([ source[0] for source in sources ] == ['tour'])
+
+            # the segments are joined like by the library
+            distance, elevation = convert_segments_to_arrays(read_gpx_arrays(fn))
+            expected, _ = convert_distance_and_elevation_to_audio(distance, elevation, approximate_length_in_seconds=0)
+            for workers in [0, 1]:
+                stats = render(sources, tmpdir / 'out', workers=workers, force=True, approximate_length_in_seconds=0)
+                assert(stats['rendered'] == 1)
+                _, audio = wavfile.read(tmpdir / 'out' / 'tour.wav')
+                assert(np.array_equal(audio, expected))
+
+            stats = render(sources, tmpdir / 'out', workers=0, approximate_length_in_seconds=0)
+            assert(stats['rendered'] == 0 and stats['skipped'] == 1)
+
+            # files with the same name would overwrite each other's output
+            (tmpdir / 'other').mkdir()
+            other = tmpdir / 'other' / 'tour.gpx'
+            other.write_text(gpx.to_xml())
+            self.assertRaises(ValueError, get_sources, gpx_files=[str(fn), str(other)])
+            with redirect_stderr(io.StringIO()):
+                self.assertRaises(SystemExit, main, ['render', '--gpx', str(fn), str(other), '-o', str(tmpdir / 'out')])
+
+    def test_missing_sources(self):
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+
+            for argv in [
+                         ['render', '--store', str(tmpdir / 'missing'), '-o', str(tmpdir / 'out')],
+                         ['render', '--gpx', str(tmpdir / 'missing.gpx'), '-o', str(tmpdir / 'out')],
+                        ]:
+                with redirect_stderr(io.StringIO()) as stderr:
+                    self.assertRaises(SystemExit, main, argv)
+                assert('error' in stderr.getvalue())
+                assert(not (tmpdir / 'out').exists())
+
+if __name__ == "__main__":
+
+    T = CLITest()
+    T.test_render_store()
+    T.test_render_gpx()
+    T.test_missing_sources()
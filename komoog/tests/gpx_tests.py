@@ -2,7 +2,14 @@ import unittest
 
 import numpy as np
 
-from komoog.gpx import convert_gpx_tracks_to_arrays
+from komoog.gpx import (
+        convert_gpx_tracks_to_arrays,
+        compute_distance_2d,
+        convert_tour_to_gpx_tracks,
+        convert_tour_to_arrays,
+    )
+
+from komoog.tests._synthetic import random_walk, synthetic_tour
 
 import gpxpy
 
@@ -37,9 +44,35 @@ class GPXTest(unittest.TestCase):
         for a, b in zip(y, elev):
             assert(np.isclose(a, b))
 
+    def test_vectorized_distance(self):
+
+        # small steps (equirectangular) and a few large jumps (haversine)
+        lat, lon, _ = random_walk(1000, seed=1)
+        lat[500:] += 1.
+        lon[700:] -= 3.
+
+        points = [ gpxpy.gpx.GPXTrackPoint(a, b) for a, b in zip(lat, lon) ]
+        expected = [ A.distance_2d(B) for A, B in zip(points[:-1], points[1:]) ]
+
+        dist = compute_distance_2d(lat, lon)
+
+        assert(np.allclose(dist, expected, rtol=1e-9, atol=0))
+
+    def test_tour_conversion(self):
+
+        tour = synthetic_tour(500, seed=2)
+
+        dist, elev = convert_tour_to_arrays(tour)
+        expected_dist, expected_elev = convert_gpx_tracks_to_arrays(convert_tour_to_gpx_tracks(tour))
+
+        assert(np.allclose(dist, expected_dist))
+        assert(np.allclose(elev, expected_elev))
+
 
 
 if __name__ == "__main__":
 
     T = GPXTest()
     T.test_conversion()
+    T.test_vectorized_distance()
+    T.test_tour_conversion()
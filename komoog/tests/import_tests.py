@@ -0,0 +1,53 @@
+import unittest
+import subprocess
+import sys
+
+def _imported_modules(statement):
+    """
+    Run ``statement`` in a fresh interpreter with ``-X importtime``
+    and return the names of all modules that were imported.
+    """
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True,
+                            check=True,
+                           )
+
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            modules.add(name.split('.')[0] if name.split('.')[0] != 'komoog' else name)
+
+    return modules
+
+HEAVY = {'scipy', 'simpleaudio', 'matplotlib', 'requests', 'gpxpy', 'simplejson'}
+
+class ImportTest(unittest.TestCase):
+
+    def test_import_komoog(self):
+
+        modules = _imported_modules('import komoog')
+        assert('komoog' in modules)
+        assert(modules & (HEAVY | {'numpy'}) == set())
+        assert(not any(m.startswith('komoog.') and m != 'komoog.metadata' for m in modules))
+
+    def test_lazy_submodules(self):
+
+        modules = _imported_modules('import sys, komoog; komoog.gpx.convert_tour_to_arrays; '
+                                    'assert "komoog.gpx" in sys.modules')
+        assert(modules & HEAVY == set())
+
+    def test_render_imports(self):
+
+        modules = _imported_modules('import komoog.audio, komoog.io, komoog.sinks')
+        assert(modules & HEAVY == {'simplejson'})
+
+
+if __name__ == "__main__":
+
+    T = ImportTest()
+    T.test_import_komoog()
+    T.test_lazy_submodules()
+    T.test_render_imports()
@@ -0,0 +1,73 @@
+import io
+import json
+import unittest
+
+import komoog.audio
+import komoog.instrument
+from komoog.instrument import Recorder, stage, is_enabled
+from komoog.audio import convert_tour_to_audio
+
+from komoog.tests._synthetic import synthetic_tour
+
+class InstrumentTest(unittest.TestCase):
+
+    def test_disabled(self):
+
+        assert(not is_enabled())
+        assert(stage('a') is stage('b', points=1))
+
+        with stage('a') as s:
+            s.update(points=1)
+
+    def test_convert_tour_to_audio(self):
+
+        tour = synthetic_tour(500)
+        records = []
+
+        # render, such that the smoothing and resampling stages run
+        original_cache = komoog.audio.wavetable_cache
+        komoog.audio.wavetable_cache = None
+        try:
+            with Recorder(callback=records.append) as recorder:
+                assert(is_enabled())
+                audio, _ = convert_tour_to_audio(tour, length_in_samples=3000)
+        finally:
+            komoog.audio.wavetable_cache = original_cache
+
+        assert(not is_enabled())
+        assert(recorder.records == records)
+
+        stages = { record['stage']: record for record in records }
+        for name in ['gpx.coordinates', 'gpx.distance', 'audio.signal', 'audio.tile', 'audio.convert_tour_to_audio']:
+            assert(name in stages)
+        assert(stages['gpx.coordinates']['points'] == 500)
+        assert(stages['gpx.distance']['parent'] == 'audio.convert_tour_to_audio')
+        assert(stages['audio.convert_tour_to_audio']['parent'] is None)
+        assert(stages['audio.convert_tour_to_audio']['samples'] == len(audio))
+        assert(stages['audio.tile']['nbytes'] == audio.nbytes)
+        assert(all(record['wall_time'] >= 0 for record in records))
+
+        assert(not stages['audio.cache']['hit'])
+        assert('audio.smooth' in stages)
+        assert('audio.resample' in stages)
+
+        summary = recorder.summary()
+        assert(summary['audio.convert_tour_to_audio']['calls'] == 1)
+
+        f = io.StringIO()
+        komoog.instrument.write_jsonl(records, f)
+        lines = f.getvalue().splitlines()
+        assert([ json.loads(line) for line in lines ] == records)
+
+        with Recorder() as recorder:
+            convert_tour_to_audio(tour, set_tune_to_follow_tour_profile=True, length_in_samples=3000)
+
+        stages = { record['stage'] for record in recorder.records }
+        assert({'audio.wavetable', 'audio.pitch', 'audio.synthesize'} <= stages)
+
+
+if __name__ == "__main__":
+
+    T = InstrumentTest()
+    T.test_disabled()
+    T.test_convert_tour_to_audio()
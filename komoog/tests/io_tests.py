@@ -0,0 +1,287 @@
+import sys
+import unittest
+import tempfile
+import subprocess
+import importlib.util
+import tracemalloc
+import datetime
+from pathlib import Path
+
+import numpy as np
+
+from komoog.gpx import (
+        convert_gpx_tracks_to_arrays,
+        convert_segments_to_arrays,
+        convert_tour_to_arrays,
+        convert_tour_to_coordinate_arrays,
+    )
+from komoog.io import (
+        read_gpx_arrays,
+        read_tours,
+        iter_tours,
+        write_tours,
+        read_tour,
+        read_tour_index,
+        write_tour,
+        delete_tour,
+        write_wav,
+        open_audio_writer,
+        WavWriter,
+    )
+from komoog.audio import iter_signal_audio
+
+from komoog.tests._synthetic import random_walk
+
+import gpxpy
+
+class IOTest(unittest.TestCase):
+
+    def test_streaming_gpx(self):
+
+        t0 = datetime.datetime(2021, 8, 24, 10, tzinfo=datetime.timezone.utc)
+
+        gpx = gpxpy.gpx.GPX()
+        track = gpxpy.gpx.GPXTrack()
+        gpx.tracks.append(track)
+
+        for seg_id in range(2):
+            segment = gpxpy.gpx.GPXTrackSegment()
+            lat, lon, ele = random_walk(2000, seed=3+seg_id)
+            lat += seg_id
+            for i, (a, b, c) in enumerate(zip(lat, lon, ele)):
+                segment.points.append(gpxpy.gpx.GPXTrackPoint(a, b, elevation=c,
+                                                             time=t0+datetime.timedelta(seconds=i)))
+            track.segments.append(segment)
+
+        expected = convert_gpx_tracks_to_arrays(gpx.tracks)
+
+        # an empty segment is skipped
+        track.segments.append(gpxpy.gpx.GPXTrackSegment())
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = Path(tmpdir) / 'tour.gpx'
+            with open(fn, 'w') as f:
+                f.write(gpx.to_xml())
+
+            segments = read_gpx_arrays(fn, with_time=True)
+
+        assert(len(segments) == 2)
+        assert(np.isclose(segments[0][3][1] - segments[0][3][0], 1.))
+        assert(np.isclose(segments[0][3][0], t0.timestamp()))
+
+        dist, elev = convert_segments_to_arrays(segments)
+
+        assert(np.allclose(dist, expected[0]))
+        assert(np.allclose(elev, expected[1]))
+
+    def test_streaming_gpx_extensions(self):
+
+        xml = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1"
+     xmlns:ext="http://example.com/extensions">
+  <trk><trkseg>
+    <trkpt lat="47.0" lon="8.0">
+      <ele>102.5</ele>
+      <time>2021-08-24T10:00:00Z</time>
+      <extensions><ext:point><ext:ele>9999</ext:ele><ext:time>2000-01-01T00:00:00Z</ext:time></ext:point></extensions>
+    </trkpt>
+    <trkpt lat="47.001" lon="8.001">
+      <extensions><ele>9999</ele></extensions>
+      <ele>103.5</ele>
+    </trkpt>
+    <trkpt lat="47.002" lon="8.002">
+      <extensions><ext:ele>9999</ext:ele></extensions>
+    </trkpt>
+  </trkseg></trk>
+</gpx>
+"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = Path(tmpdir) / 'tour.gpx'
+            fn.write_text(xml)
+            segments = read_gpx_arrays(fn, with_time=True)
+            with open(fn) as f:
+                gpx = gpxpy.parse(f)
+
+        assert(len(segments) == 1)
+        lat, lon, ele, t = segments[0]
+        assert(np.array_equal(ele[:2], [102.5, 103.5]))
+        assert(np.isnan(ele[2]))
+        assert(ele[0] == gpx.tracks[0].segments[0].points[0].elevation)
+        assert(t[0] == datetime.datetime(2021, 8, 24, 10, tzinfo=datetime.timezone.utc).timestamp())
+        assert(np.all(np.isnan(t[1:])))
+
+    def test_tour_store(self):
+
+        rng = np.random.default_rng(5)
+        tours = []
+        for i in range(3):
+            n = 100 + i
+            tours.append({
+                    'id': 100 + i,
+                    'name': f'tour {i}',
+                    'distance': 1000. * i,
+                    'coordinates': [ {'lat': a, 'lng': b, 'alt': c, 't': t}
+                                     for a, b, c, t in zip(rng.random(n).tolist(),
+                                                           rng.random(n).tolist(),
+                                                           rng.random(n).tolist(),
+                                                           range(n))
+                                   ],
+                })
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+
+            write_tours(tours, tmpdir)
+
+            index = read_tour_index(tmpdir)
+            assert([ entry['id'] for entry in index ] == [100, 101, 102])
+            assert(index[1]['name'] == 'tour 1')
+            assert(index[1]['number_of_points'] == 101)
+            assert(np.isclose(index[1]['max_alt'], max(p['alt'] for p in tours[1]['coordinates'])))
+
+            assert(read_tour(101, tmpdir) == tours[1])
+            assert(read_tours(tmpdir) == tours)
+
+            # memory-mapped coordinates are converted without copies
+            mapped_tour = read_tour(101, tmpdir, coordinates_as_array=True)
+            coordinates = mapped_tour['coordinates']
+            assert(isinstance(coordinates, np.memmap))
+            lat, lng, alt = convert_tour_to_coordinate_arrays(mapped_tour)
+            assert(np.shares_memory(lat, coordinates))
+            for a, b in zip(convert_tour_to_arrays(mapped_tour), convert_tour_to_arrays(tours[1])):
+                assert(np.array_equal(a, b))
+            del lat, lng, alt, coordinates, mapped_tour
+
+            delete_tour(100, tmpdir)
+            write_tour(dict(tours[1], name='renamed'), tmpdir)
+            index = read_tour_index(tmpdir)
+            assert([ entry['id'] for entry in index ] == [101, 102])
+            assert(index[0]['name'] == 'renamed')
+
+            # stale tours are removed
+            write_tours(tours[2:], tmpdir)
+            assert([ entry['id'] for entry in read_tour_index(tmpdir) ] == [102])
+            assert(not (Path(tmpdir) / '101.npy').exists())
+
+    def test_tour_store_round_trip(self):
+
+        rng = np.random.default_rng(11)
+        coordinates = [ {'lat': a, 'lng': b, 'alt': c} for a, b, c in rng.random((20, 3)).tolist() ]
+        tours = [
+                    {'id': 1, 'coordinates': coordinates},
+                    {'id': 2, 'coordinates': [ dict(point, t=float(i)) for i, point in enumerate(coordinates) ]},
+                    {'id': 3, 'coordinates': [ dict(point, t=0.) if i % 2 else point for i, point in enumerate(coordinates) ]},
+                ]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+
+            # coordinates given as dicts
+            for tour in tours:
+                write_tour(tour, tmpdir)
+                assert(read_tour(tour['id'], tmpdir) == tour)
+
+            # coordinates given as a structured array from the store
+            for tour in tours:
+                mapped_tour = read_tour(tour['id'], tmpdir, coordinates_as_array=True)
+                write_tour(mapped_tour, tmpdir)
+                del mapped_tour
+                assert(read_tour(tour['id'], tmpdir) == tour)
+
+    @unittest.skipUnless(sys.platform != 'win32', 'needs the resource module')
+    def test_open_files(self):
+
+        num_tours = 300
+        max_open_files = 128
+
+        rng = np.random.default_rng(10)
+        tours = [ {
+                    'id': i,
+                    'coordinates': [ {'lat': a, 'lng': b, 'alt': c, 't': 0}
+                                     for a, b, c in rng.random((5, 3)).tolist() ],
+                  } for i in range(num_tours) ]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+
+            write_tours(tours, tmpdir)
+            assert(len(list(iter_tours(tmpdir))) == num_tours)
+            mapped_tours = read_tours(tmpdir, coordinates_as_array=True)
+            assert(isinstance(mapped_tours, list) and len(mapped_tours) == num_tours)
+            del mapped_tours
+
+            # map more tours than the process may open files
+            code = '\n'.join([
+                    'import resource, sys',
+                    'from komoog.io import iter_tours',
+                    'from komoog.gpx import convert_tour_to_arrays',
+                    '_, hard = resource.getrlimit(resource.RLIMIT_NOFILE)',
+                    f'resource.setrlimit(resource.RLIMIT_NOFILE, ({max_open_files}, hard))',
+                    'n = 0',
+                    f'for tour in iter_tours({str(tmpdir)!r}, coordinates_as_array=True):',
+                    '    convert_tour_to_arrays(tour)',
+                    '    n += 1',
+                    f'assert n == {num_tours}',
+                   ])
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+            assert(result.returncode == 0), result.stderr
+
+    def test_wav_writer(self):
+
+        rng = np.random.default_rng(8)
+        mono = rng.integers(-32768, 32768, size=10001).astype(np.int16)
+        stereo = rng.integers(-32768, 32768, size=(5000, 2)).astype(np.int16)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            for audio in [mono, stereo, mono[:0]]:
+                num_channels = 1 if audio.ndim == 1 else audio.shape[1]
+                write_wav(tmpdir / 'expected.wav', audio, 22050)
+                with WavWriter(tmpdir / 'streamed.wav', 22050, num_channels) as writer:
+                    for start in range(0, len(audio), 999):
+                        writer.write(audio[start:start+999])
+                assert(writer.frames_written == len(audio))
+                assert((tmpdir / 'streamed.wav').read_bytes() == (tmpdir / 'expected.wav').read_bytes())
+
+            # peak memory is a chunk, not the file
+            fn = tmpdir / 'long.wav'
+            x = np.linspace(0, 1, 100)
+            chunks = iter_signal_audio(x, np.sin(2*np.pi*x), length_in_samples=44100*60, chunk_size=4096)
+            # the first chunk triggers the lazy imports of scipy, which are not traced
+            first = next(chunks)
+            tracemalloc.start()
+            with open_audio_writer(fn, 44100) as writer:
+                writer.write(first)
+                for chunk in chunks:
+                    writer.write(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert(fn.stat().st_size == 44 + 2*44100*60)
+            assert(peak < 2**20)
+
+            self.assertRaises(ValueError, open_audio_writer, tmpdir / 'audio.mp3', 44100)
+
+    @unittest.skipUnless(importlib.util.find_spec('soundfile'), 'soundfile is not installed')
+    def test_flac_writer(self):
+
+        import soundfile
+
+        audio = np.random.default_rng(9).integers(-32768, 32768, size=(5000, 2)).astype(np.int16)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = Path(tmpdir) / 'audio.flac'
+            with open_audio_writer(fn, 44100, num_channels=2) as writer:
+                writer.write(audio[:2000])
+                writer.write(audio[2000:])
+            data, sampling_rate = soundfile.read(str(fn), dtype='int16')
+
+        assert(sampling_rate == 44100)
+        assert(np.array_equal(data, audio))
+
+
+if __name__ == "__main__":
+
+    T = IOTest()
+    T.test_streaming_gpx()
+    T.test_streaming_gpx_extensions()
+    T.test_tour_store()
+    T.test_tour_store_round_trip()
+    T.test_open_files()
+    T.test_wav_writer()
@@ -0,0 +1,260 @@
+import unittest
+import tempfile
+import threading
+import gzip
+import json
+import hashlib
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from unittest import mock
+
+import requests
+
+import komoog.komoot
+from komoog.komoot import (
+        get_tours,
+        get_tours_and_session,
+        download_komoot_tours,
+        sync_tours,
+        HTTPCache,
+    )
+from komoog.io import read_tour_index, read_tour
+
+class _StubKomoot(BaseHTTPRequestHandler):
+    """Mimics komoot's tour listing and coordinates endpoints."""
+
+    number_of_tours = 10
+    changed_at = {}
+    deleted = set()
+    failures = {}
+    requests = []
+    require_login = False
+    valid_sessions = set()
+    logins = 0
+    compress = False
+    sent_bytes = {}
+
+    def do_POST(self):
+
+        if self.path == '/signin':
+            _StubKomoot.logins += 1
+            session_id = f'session{self.logins}'
+            self.valid_sessions.add(session_id)
+            self._send(200, {}, cookie=f'session={session_id}; Path=/')
+        else:
+            self._send(404, {})
+
+    def do_GET(self):
+
+        self.requests.append(self.path)
+        parts = self.path.strip('/').split('/')
+
+        if parts[0] in ('signin', 'transfer'):
+            self._send(200, {})
+        elif parts[0] == 'user' and parts[2] == 'tours':
+            cookie = self.headers.get('Cookie', '')
+            if self.require_login and not any(f'session={s}' in cookie for s in self.valid_sessions):
+                self._send(403, {})
+                return
+            base = f'http://{self.server.server_address[0]}:{self.server.server_address[1]}'
+            items = [ {
+                        'id': i,
+                        'name': f'tour {i}',
+                        'changed_at': self.changed_at.get(i, '2021-08-24T10:00:00.000Z'),
+                        '_links': {'coordinates': {'href': f'{base}/tours/{i}/coordinates'}},
+                      } for i in range(self.number_of_tours) if i not in self.deleted ]
+            self._send(200, {'user': {'_embedded': {'tours': {'_embedded': {'items': items}}}}})
+        elif parts[0] == 'tours' and parts[2] == 'coordinates':
+            tour_id = int(parts[1])
+            if self.failures.get(tour_id, 0) > 0:
+                self.failures[tour_id] -= 1
+                self._send(503, {})
+            else:
+                items = [ {'lat': tour_id, 'lng': j, 'alt': 100., 't': j} for j in range(5) ]
+                self._send(200, {'items': items})
+        else:
+            self._send(404, {})
+
+    def _send(self, status, data, cookie=None):
+
+        body = json.dumps(data).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if self.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.sent_bytes[self.path] = len(body)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        if cookie is not None:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class KomootTest(unittest.TestCase):
+
+    def setUp(self):
+
+        _StubKomoot.number_of_tours = 10
+        _StubKomoot.changed_at = {}
+        _StubKomoot.deleted = set()
+        _StubKomoot.failures = {}
+        _StubKomoot.requests = []
+        _StubKomoot.require_login = False
+        _StubKomoot.valid_sessions = set()
+        _StubKomoot.logins = 0
+        _StubKomoot.compress = False
+        _StubKomoot.sent_bytes = {}
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _StubKomoot)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address
+        self.tours_url = f'http://{host}:{port}/user/{{client_id}}/tours'
+        self.login_url = f'http://{host}:{port}/signin'
+        self.transfer_url = f'http://{host}:{port}/transfer'
+
+    def tearDown(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent_download(self):
+
+        _StubKomoot.failures = {3: 2, 7: 1}
+
+        with mock.patch.object(komoog.komoot, '_TOURS_URL', self.tours_url):
+            session = requests.Session()
+            tours = get_tours(session, 'client', timeout=5)
+            assert(len(tours) == _StubKomoot.number_of_tours)
+
+            tours = download_komoot_tours(tours, session, max_workers=4, timeout=5, backoff_factor=0.01)
+
+        assert([ tour['id'] for tour in tours ] == list(range(_StubKomoot.number_of_tours)))
+        for tour in tours:
+            assert(len(tour['coordinates']) == 5)
+            assert(tour['coordinates'][0]['lat'] == tour['id'])
+
+        # failed requests were retried
+        assert(_StubKomoot.requests.count('/tours/3/coordinates') == 3)
+        assert(_StubKomoot.requests.count('/tours/7/coordinates') == 2)
+
+    def test_retries_exhausted(self):
+
+        _StubKomoot.failures = {0: 10}
+
+        with mock.patch.object(komoog.komoot, '_TOURS_URL', self.tours_url):
+            session = requests.Session()
+            tours = get_tours(session, 'client', timeout=5)[:2]
+
+            with self.assertRaises(requests.exceptions.RequestException):
+                download_komoot_tours(tours, session, max_workers=2, timeout=5, retries=2, backoff_factor=0.01)
+
+    def test_incremental_sync(self):
+
+        with mock.patch.object(komoog.komoot, '_TOURS_URL', self.tours_url), \
+             tempfile.TemporaryDirectory() as tmpdir:
+
+            session = requests.Session()
+
+            report = sync_tours(get_tours(session, 'client'), session, directory=tmpdir)
+            assert(report['added'] == 10)
+            assert(report['bytes_transferred'] > 0)
+            assert(len(read_tour_index(tmpdir)) == 10)
+
+            report = sync_tours(get_tours(session, 'client'), session, directory=tmpdir)
+            assert(report == {'added': 0, 'modified': 0, 'deleted': 0, 'unchanged': 10, 'bytes_transferred': 0})
+
+            _StubKomoot.changed_at = {2: '2021-09-01T10:00:00.000Z'}
+            _StubKomoot.deleted = {5, 6}
+            _StubKomoot.number_of_tours = 11
+            _StubKomoot.requests = []
+
+            report = sync_tours(get_tours(session, 'client'), session, directory=tmpdir)
+            assert(report['added'] == 1)
+            assert(report['modified'] == 1)
+            assert(report['deleted'] == 2)
+            assert(report['unchanged'] == 7)
+            assert(sorted(_StubKomoot.requests[1:]) == ['/tours/10/coordinates', '/tours/2/coordinates'])
+
+            index = read_tour_index(tmpdir)
+            assert(sorted(entry['id'] for entry in index) == [0, 1, 2, 3, 4, 7, 8, 9, 10])
+            assert(read_tour(2, tmpdir)['changed_at'] == '2021-09-01T10:00:00.000Z')
+
+    def test_http_cache(self):
+
+        _StubKomoot.require_login = True
+        credentials = {'email': 'a@b.c', 'password': 'pw', 'clientid': 'client'}
+
+        with mock.patch.object(komoog.komoot, '_TOURS_URL', self.tours_url), \
+             mock.patch.object(komoog.komoot, '_LOGIN_URL', self.login_url), \
+             mock.patch.object(komoog.komoot, '_TRANSFER_URL', self.transfer_url), \
+             mock.patch.object(komoog.komoot, 'get_credentials', return_value=credentials), \
+             tempfile.TemporaryDirectory() as tmpdir:
+
+            cache = HTTPCache(tmpdir)
+
+            tours, session = get_tours_and_session(timeout=5, cache=cache)
+            tours = download_komoot_tours(tours, session, cache=cache)
+            coordinates = [ tour['coordinates'] for tour in tours ]
+            assert(_StubKomoot.logins == 1)
+            assert(cache.misses == 11)
+
+            # a new session reuses the persisted cookies and gets 304s
+            tours, session = get_tours_and_session(timeout=5, cache=cache)
+            cached_tours = download_komoot_tours(tours, session, cache=cache)
+            assert(_StubKomoot.logins == 1)
+            assert(cache.not_modified == 11)
+            assert([ tour['coordinates'] for tour in cached_tours ] == coordinates)
+
+            # expired session on the server leads to a new login
+            _StubKomoot.valid_sessions = set()
+            tours, session = get_tours_and_session(timeout=5, cache=cache)
+            assert(_StubKomoot.logins == 2)
+            assert(len(tours) == 10)
+
+    def test_transferred_bytes(self):
+
+        _StubKomoot.compress = True
+        _StubKomoot.number_of_tours = 3
+
+        with mock.patch.object(komoog.komoot, '_TOURS_URL', self.tours_url), \
+             tempfile.TemporaryDirectory() as tmpdir:
+
+            session = requests.Session()
+            report = sync_tours(get_tours(session, 'client'), session, directory=tmpdir)
+
+            # compressed bodies are counted as received, not as decoded
+            sent = [ size for path, size in _StubKomoot.sent_bytes.items() if path.endswith('/coordinates') ]
+            assert(len(sent) == 3)
+            assert(report['bytes_transferred'] == sum(sent))
+
+
+if __name__ == "__main__":
+
+    T = KomootTest()
+    T.setUp()
+    T.test_concurrent_download()
+    T.tearDown()
+    T.setUp()
+    T.test_incremental_sync()
+    T.tearDown()
+    T.setUp()
+    T.test_http_cache()
+    T.tearDown()
+    T.setUp()
+    T.test_transferred_bytes()
+    T.tearDown()
@@ -16,19 +16,24 @@ setup(
     description="Convert komoot hiking trips to sounds.",
     long_description='',
     packages=setuptools.find_packages(),
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=[
                        'numpy>=1.17',
                        'scipy>=1.5',
                        'gpxpy>=1.4.2',
                        'simplejson>=3.17.2',
-                       'simpleaudio>=1.0.4',
                        'matplotlib>=3.0.0',
     ],
+    extras_require={
+                       'playback': ['simpleaudio>=1.0.4'],
+                       'flac': ['soundfile>=0.10'],
+    },
+    entry_points={
+                       'console_scripts': ['komoog=komoog.cli:main'],
+    },
     tests_require=['pytest', 'pytest-cov'],
     setup_requires=['pytest-runner'],
     classifiers=['License :: OSI Approved :: MIT License',
-                 'Programming Language :: Python :: 3.6',
                  'Programming Language :: Python :: 3.7',
                  'Programming Language :: Python :: 3.8',
                  ],